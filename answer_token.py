@@ -0,0 +1,32 @@
+from itsdangerous import URLSafeSerializer, BadSignature
+
+class AnswerTokenSigner:
+    """答题令牌
+
+    渲染打乱选项后的题目时签发，记录题目ID、选项排列和正确选项的位置。
+    提交答案时校验签名即可判断对错，无需重新读取题目，也不信任客户端提交的正确答案。
+    """
+    def __init__(self, secret_key):
+        self.serializer = URLSafeSerializer(secret_key, salt='answer-token')
+
+    def issue(self, question):
+        """为打乱选项后的题目签发令牌"""
+        return self.serializer.dumps([
+            question['id'],
+            question['permutation'],
+            question['answer_index']
+        ])
+
+    def verify(self, token):
+        """校验令牌，无效时返回 None"""
+        if not token:
+            return None
+        try:
+            question_id, permutation, answer_index = self.serializer.loads(token)
+        except (BadSignature, TypeError, ValueError):
+            return None
+        return {
+            'question_id': question_id,
+            'permutation': permutation,
+            'answer_index': answer_index
+        }
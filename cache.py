@@ -0,0 +1,319 @@
+import os
+import re
+import json
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+def page_summary(questions):
+    """计算页面缓存的题目数、最大题号和内容哈希"""
+    content = json.dumps(questions, ensure_ascii=False, sort_keys=True)
+    return {
+        'count': len(questions),
+        'max_number': max((q.get('number', 0) for q in questions), default=0),
+        'hash': hashlib.sha1(content.encode('utf-8')).hexdigest()
+    }
+
+class JsonPageCache:
+    """JSON 文件缓存
+
+    每页题目保存为一个 JSON 文件，另有一个清单文件记录每页的题目数、最大题号、
+    内容哈希、获取时间和 ETag/Last-Modified。
+    多个进程共用同一个清单文件，内存中的清单在文件被其他进程改写后重新读取，
+    更新记录前总是先读取最新的清单，避免覆盖其他进程写入的记录。
+    """
+    def __init__(self, config, question_type):
+        self.config = config
+        self.question_type = question_type
+        self.logger = logging.getLogger('scraper.cache')
+        self._manifest = None
+        self._manifest_mtime = None
+        self._lock = threading.Lock()
+
+    def _get_cache_path(self, page):
+        """获取缓存文件路径"""
+        cache_key = f"type_{self.question_type}_page_{page}"
+        return os.path.join(self.config.CACHE_DIR, f"{cache_key}.json")
+
+    def _get_manifest_path(self):
+        """获取缓存清单文件路径"""
+        return os.path.join(self.config.CACHE_DIR, f"type_{self.question_type}_manifest.json")
+
+    def _rebuild_manifest(self):
+        """扫描缓存目录重建缓存清单"""
+        manifest = {'pages': {}}
+        prefix = f"type_{self.question_type}_page_"
+        for cache_file in os.listdir(self.config.CACHE_DIR):
+            match = re.fullmatch(rf"{prefix}(\d+)\.json", cache_file)
+            if not match:
+                continue
+            file_path = os.path.join(self.config.CACHE_DIR, cache_file)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    questions = json.load(f)
+            except Exception as e:
+                self.logger.error("读取缓存文件 %s 失败: %s", cache_file, e)
+                continue
+            page_entry = page_summary(questions)
+            page_entry['fetched_at'] = datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
+            manifest['pages'][match.group(1)] = page_entry
+
+        self.logger.info("缓存清单已重建，共 %s 页", len(manifest['pages']))
+        return manifest
+
+    def _manifest_file_mtime(self):
+        """清单文件的修改时间，文件不存在时返回 None"""
+        try:
+            return os.stat(self._get_manifest_path()).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _get_manifest(self, reload=False):
+        """加载缓存清单，清单缺失或损坏时重建，需在持有 _lock 时调用
+
+        清单文件的修改时间与上次读取时不同（被其他进程改写）或 reload 为 True 时重新读取
+        """
+        mtime = self._manifest_file_mtime()
+        if reload or self._manifest is None or mtime != self._manifest_mtime:
+            manifest_path = self._get_manifest_path()
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if not isinstance(manifest.get('pages'), dict):
+                    raise ValueError("缺少 pages 字段")
+                self._manifest = manifest
+                self._manifest_mtime = mtime
+            except FileNotFoundError:
+                self._manifest = self._rebuild_manifest()
+                self._write_manifest()
+            except Exception as e:
+                self.logger.error("读取缓存清单失败，重新构建: %s", e)
+                self._manifest = self._rebuild_manifest()
+                self._write_manifest()
+        return self._manifest
+
+    def _write_manifest(self):
+        """原子地写入缓存清单，需在持有 _lock 时调用"""
+        manifest_path = self._get_manifest_path()
+        # 临时文件名带进程号，多个进程同时写入时互不干扰
+        tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._manifest, f, ensure_ascii=False)
+            os.replace(tmp_path, manifest_path)
+            self._manifest_mtime = self._manifest_file_mtime()
+        except Exception as e:
+            self.logger.error("保存缓存清单失败: %s", e)
+
+    def _update_entry(self, page, validators=None, questions=None):
+        """更新清单中的页面记录：获取时间、ETag/Last-Modified 及题目摘要"""
+        with self._lock:
+            page_entry = self._get_manifest(reload=True)['pages'].setdefault(str(page), {})
+            if questions is not None:
+                page_entry.update(page_summary(questions))
+            if validators:
+                page_entry.update(validators)
+            page_entry['fetched_at'] = datetime.now().isoformat()
+            self._write_manifest()
+
+    def get_entry(self, page):
+        """获取指定页面在缓存清单中的记录"""
+        with self._lock:
+            return dict(self._get_manifest()['pages'].get(str(page), {}))
+
+    def has_page(self, page):
+        """指定页面是否已缓存"""
+        return os.path.exists(self._get_cache_path(page))
+
+    def get_info(self):
+        """从缓存清单获取题目总数和每页题目数"""
+        with self._lock:
+            pages = list(self._get_manifest()['pages'].values())
+
+        max_number = max((p.get('max_number', 0) for p in pages), default=0)
+        questions_per_page = max((p.get('count', 0) for p in pages), default=0)
+        return max_number, questions_per_page
+
+    def load(self, page, check_expire=True):
+        """从缓存加载数据"""
+        cache_path = self._get_cache_path(page)
+        if not os.path.exists(cache_path):
+            return None
+
+        # 检查缓存是否过期
+        if check_expire and self.config.CACHE_EXPIRE_DAYS > 0:  # 只有当过期天数大于0时才检查
+            file_time = datetime.fromtimestamp(os.path.getmtime(cache_path))
+            expire_time = datetime.now() - timedelta(days=self.config.CACHE_EXPIRE_DAYS)
+            if file_time < expire_time:
+                return None
+
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.error("读取缓存失败: %s", e)
+            return None
+
+    def save(self, page, questions, validators=None):
+        """保存数据到缓存"""
+        cache_path = self._get_cache_path(page)
+        try:
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump(questions, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            self.logger.error("保存缓存失败: %s", e)
+            return
+
+        self._update_entry(page, validators, questions)
+
+    def touch(self, page, validators=None):
+        """页面未变化时刷新缓存的获取时间"""
+        os.utime(self._get_cache_path(page))
+        self._update_entry(page, validators)
+
+    def iter_questions(self):
+        """按页码顺序逐页读取所有缓存的题目"""
+        with self._lock:
+            pages = sorted(int(page) for page in self._get_manifest()['pages'])
+        for page in pages:
+            yield from self.load(page, check_expire=False) or []
+
+class SQLitePageCache:
+    """SQLite 缓存
+
+    所有页面保存在缓存目录下的一个 SQLite 文件中，题目数据以 zlib 压缩的 JSON 存储，
+    按 (题目类型, 页码) 随机读取，也可按页码顺序流式读取全部题目。
+    """
+    def __init__(self, config, question_type):
+        self.config = config
+        self.question_type = question_type
+        self.logger = logging.getLogger('scraper.cache')
+        self.path = os.path.join(config.CACHE_DIR, 'cache.db')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS pages (
+            question_type TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            data BLOB NOT NULL,  -- zlib 压缩的题目 JSON
+            count INTEGER NOT NULL,
+            max_number INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL,  -- Unix 时间戳
+            PRIMARY KEY (question_type, page)
+        )
+        ''')
+        self._conn.commit()
+
+    def get_entry(self, page):
+        """获取指定页面的缓存记录"""
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT count, max_number, hash, etag, last_modified, fetched_at
+                FROM pages WHERE question_type = ? AND page = ?
+            ''', (self.question_type, page)).fetchone()
+        if not row:
+            return {}
+        return {
+            'count': row[0],
+            'max_number': row[1],
+            'hash': row[2],
+            'etag': row[3],
+            'last_modified': row[4],
+            'fetched_at': datetime.fromtimestamp(row[5]).isoformat()
+        }
+
+    def has_page(self, page):
+        """指定页面是否已缓存"""
+        return bool(self.get_entry(page))
+
+    def get_info(self):
+        """获取题目总数和每页题目数"""
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT MAX(max_number), MAX(count) FROM pages WHERE question_type = ?
+            ''', (self.question_type,)).fetchone()
+        return row[0] or 0, row[1] or 0
+
+    def load(self, page, check_expire=True):
+        """从缓存加载数据"""
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT data, fetched_at FROM pages WHERE question_type = ? AND page = ?
+            ''', (self.question_type, page)).fetchone()
+        if not row:
+            return None
+
+        # 检查缓存是否过期
+        if check_expire and self.config.CACHE_EXPIRE_DAYS > 0:
+            if row[1] < time.time() - self.config.CACHE_EXPIRE_DAYS * 86400:
+                return None
+
+        try:
+            return json.loads(zlib.decompress(row[0]))
+        except Exception as e:
+            self.logger.error("读取缓存失败: %s", e)
+            return None
+
+    def save(self, page, questions, validators=None):
+        """保存数据到缓存"""
+        validators = validators or {}
+        summary = page_summary(questions)
+        data = zlib.compress(json.dumps(questions, ensure_ascii=False).encode('utf-8'))
+        try:
+            with self._lock:
+                self._conn.execute('''
+                    INSERT OR REPLACE INTO pages
+                    (question_type, page, data, count, max_number, hash, etag, last_modified, fetched_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (self.question_type, page, data, summary['count'], summary['max_number'],
+                      summary['hash'], validators.get('etag'), validators.get('last_modified'),
+                      time.time()))
+                self._conn.commit()
+        except Exception as e:
+            self.logger.error("保存缓存失败: %s", e)
+
+    def touch(self, page, validators=None):
+        """页面未变化时刷新缓存的获取时间"""
+        validators = validators or {}
+        with self._lock:
+            self._conn.execute('''
+                UPDATE pages SET
+                    fetched_at = ?,
+                    etag = COALESCE(?, etag),
+                    last_modified = COALESCE(?, last_modified)
+                WHERE question_type = ? AND page = ?
+            ''', (time.time(), validators.get('etag'), validators.get('last_modified'),
+                  self.question_type, page))
+            self._conn.commit()
+
+    def iter_questions(self):
+        """按页码顺序逐页读取所有缓存的题目，使用独立连接流式读取"""
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute('''
+                SELECT data FROM pages WHERE question_type = ? ORDER BY page
+            ''', (self.question_type,))
+            for (data,) in cursor:
+                yield from json.loads(zlib.decompress(data))
+        finally:
+            conn.close()
+
+CACHE_BACKENDS = {
+    'json': JsonPageCache,
+    'sqlite': SQLitePageCache
+}
+
+def create_page_cache(config, question_type):
+    """根据配置创建页面缓存"""
+    backend = CACHE_BACKENDS.get(config.CACHE_BACKEND)
+    if backend is None:
+        raise ValueError(f"未知的缓存类型: {config.CACHE_BACKEND}")
+    return backend(config, question_type)
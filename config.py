@@ -48,6 +48,32 @@ class Config:
         # 用户配置
         users_config = config.get('users', {})
         self.SUPERADMIN_USERNAME = self._get_env_value('SUPERADMIN_USERNAME', 'admin', users_config.get('superadmin'))
+        self.USER_CACHE_TTL = float(self._get_env_value('USER_CACHE_TTL', 
+            '30', 
+            str(users_config.get('cache_ttl', 30))))
+        self.USER_CACHE_SIZE = int(self._get_env_value('USER_CACHE_SIZE', 
+            '10000', 
+            str(users_config.get('cache_size', 10000))))
+        # 会话配置
+        session_config = config.get('session', {})
+        self.SESSION_BACKEND = self._get_env_value('SESSION_BACKEND', 
+            'sqlite', 
+            session_config.get('backend', 'sqlite'))
+        self.SESSION_LIFETIME_DAYS = float(self._get_env_value('SESSION_LIFETIME_DAYS', 
+            '7', 
+            str(session_config.get('lifetime_days', 7))))
+        self.SESSION_SWEEP_INTERVAL = int(self._get_env_value('SESSION_SWEEP_INTERVAL', 
+            '3600', 
+            str(session_config.get('sweep_interval', 3600))))
+
+        # 指标配置
+        metrics_config = config.get('metrics', {})
+        self.METRICS_ENABLED = self._get_env_value('METRICS_ENABLED', 'true', 
+            str(metrics_config.get('enabled', True))).lower() == 'true'
+        self.METRICS_SLOW_QUERY_MS = float(self._get_env_value('METRICS_SLOW_QUERY_MS', 
+            '0', 
+            str(metrics_config.get('slow_query_ms', 0))))
+
         # 日志配置
         logging_config = config.get('logging', {})
         self.LOG_LEVEL = self._get_env_value('LOG_LEVEL', 'INFO', logging_config.get('level'))
@@ -60,6 +86,8 @@ class Config:
         self.LOG_FILE = os.path.join(
             self.LOG_DIR, 
             self._get_env_value('LOG_FILE', 'app.log', logging_config.get('file')))
+        self.LOG_JSON = self._get_env_value('LOG_JSON', 'false', 
+            str(logging_config.get('json', False))).lower() == 'true'
 
         # 爬虫配置
         scraper_config = config.get('scraper', {})
@@ -70,12 +98,35 @@ class Config:
         self.SCRAPER_REQUEST_TIMEOUT = int(self._get_env_value('SCRAPER_REQUEST_TIMEOUT', 
             '10', 
             str(scraper_config.get('request_timeout'))))
-        self.SCRAPER_DELAY = int(self._get_env_value('SCRAPER_DELAY', 
+        self.SCRAPER_DELAY = float(self._get_env_value('SCRAPER_DELAY', 
             '2', 
             str(scraper_config.get('delay'))))
+        self.SCRAPER_WORKERS = int(self._get_env_value('SCRAPER_WORKERS', 
+            '4', 
+            str(scraper_config.get('workers', 4))))
+        self.SCRAPER_POOL_SIZE = int(self._get_env_value('SCRAPER_POOL_SIZE', 
+            str(self.SCRAPER_WORKERS), 
+            str(scraper_config.get('pool_size', self.SCRAPER_WORKERS))))
+        self.SCRAPER_RETRIES = int(self._get_env_value('SCRAPER_RETRIES', 
+            '3', 
+            str(scraper_config.get('retries', 3))))
+        self.SCRAPER_BACKOFF = float(self._get_env_value('SCRAPER_BACKOFF', 
+            '0.5', 
+            str(scraper_config.get('backoff', 0.5))))
         self.SCRAPER_QUESTION_TYPE = self._get_env_value('SCRAPER_QUESTION_TYPE', 
             'A', 
             scraper_config.get('question_type'))
+        self.SCRAPER_PARSER = self._get_env_value('SCRAPER_PARSER', 
+            'auto', 
+            scraper_config.get('parser'))
+        self.SCRAPER_PARSE_ONLY_CARDS = self._get_env_value('SCRAPER_PARSE_ONLY_CARDS', 'true', 
+            str(scraper_config.get('parse_only_cards', True))).lower() == 'true'
+        self.SYNC_STOP_AFTER_UNCHANGED = int(self._get_env_value('SYNC_STOP_AFTER_UNCHANGED', 
+            '3', 
+            str(scraper_config.get('sync_stop_after_unchanged', 3))))
+        self.JOB_STALE_SECONDS = int(self._get_env_value('JOB_STALE_SECONDS', 
+            '120', 
+            str(scraper_config.get('job_stale_seconds', 120))))
 
         # 题库配置
         questions_config = config.get('questions', {})
@@ -85,6 +136,30 @@ class Config:
         self.AUTO_NEXT_DELAY = int(self._get_env_value('AUTO_NEXT_DELAY', 
             '2', 
             str(questions_config.get('auto_next_delay'))))
+        self.QUIZ_PREFETCH_WINDOW = int(self._get_env_value('QUIZ_PREFETCH_WINDOW', 
+            '1', 
+            str(questions_config.get('prefetch_window', 1))))
+        self.QUESTION_SNAPSHOT_TTL = int(self._get_env_value('QUESTION_SNAPSHOT_TTL', 
+            '5', 
+            str(questions_config.get('snapshot_ttl', 5))))
+        self.QUESTIONS_PAGE_CACHE_MB = int(self._get_env_value('QUESTIONS_PAGE_CACHE_MB', 
+            '16', 
+            str(questions_config.get('page_cache_mb', 16))))
+
+        # 错题练习配置
+        practice_config = config.get('practice', {})
+        self.PRACTICE_GRADUATE_AFTER = int(self._get_env_value('PRACTICE_GRADUATE_AFTER', 
+            '3', 
+            str(practice_config.get('graduate_after', 3))))
+
+        # 模拟考试配置
+        exam_config = config.get('exam', {})
+        self.EXAM_QUESTION_COUNT = int(self._get_env_value('EXAM_QUESTION_COUNT', 
+            '50', 
+            str(exam_config.get('question_count', 50))))
+        self.EXAM_TIME_LIMIT = int(self._get_env_value('EXAM_TIME_LIMIT', 
+            '60', 
+            str(exam_config.get('time_limit', 60))))
 
         # 缓存配置
         cache_config = config.get('cache', {})
@@ -93,11 +168,35 @@ class Config:
         self.CACHE_EXPIRE_DAYS = int(self._get_env_value('CACHE_EXPIRE_DAYS', 
             '0', 
             str(cache_config.get('expire_days'))))
+        self.CACHE_BACKEND = self._get_env_value('CACHE_BACKEND', 
+            'json', 
+            cache_config.get('backend'))
 
         # 数据库配置
         database_config = config.get('database', {})
         self.CLEAR_DATABASE = self._get_env_value('CLEAR_DATABASE', 'false', 
             str(database_config.get('clear_database'))).lower() == 'true'
+        self.DATABASE_JOURNAL_MODE = self._get_env_value('DATABASE_JOURNAL_MODE', 
+            'WAL', 
+            database_config.get('journal_mode'))
+        self.DATABASE_SYNCHRONOUS = self._get_env_value('DATABASE_SYNCHRONOUS', 
+            'NORMAL', 
+            database_config.get('synchronous'))
+        self.DATABASE_BUSY_TIMEOUT = int(self._get_env_value('DATABASE_BUSY_TIMEOUT', 
+            '5000', 
+            str(database_config.get('busy_timeout', 5000))))
+        self.DATABASE_CACHE_SIZE = int(self._get_env_value('DATABASE_CACHE_SIZE', 
+            '-8000', 
+            str(database_config.get('cache_size', -8000))))
+        self.DATABASE_MMAP_SIZE = int(self._get_env_value('DATABASE_MMAP_SIZE', 
+            '268435456', 
+            str(database_config.get('mmap_size', 268435456))))
+        self.DATABASE_WRITE_BEHIND_MS = int(self._get_env_value('DATABASE_WRITE_BEHIND_MS', 
+            '0', 
+            str(database_config.get('write_behind_ms', 0))))
+        self.DATABASE_WRITE_BEHIND_MAX_EVENTS = int(self._get_env_value('DATABASE_WRITE_BEHIND_MAX_EVENTS', 
+            '200', 
+            str(database_config.get('write_behind_max_events', 200))))
 
         # 环境配置
         env = self._get_env_value('ENV', 'development')
@@ -1,41 +1,325 @@
 import sqlite3
+import atexit
 from datetime import datetime
 import threading
-from flask import g
 import logging
-import sys
 import random
+import time
+import json
+import ast
+import hashlib
+import secrets
+from collections import OrderedDict
+from metrics import InstrumentedConnection
+
+# 允许通过配置设置的 PRAGMA 取值
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_LEVELS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+# 答题和错题练习路径上的高频查询。方法和执行计划检查共用这些语句，
+# 修改查询后启动检查和 tests/test_query_plans.py 都会检查新的执行计划
+USER_PROGRESS_QUERY = 'SELECT current_question FROM user_progress WHERE user_id = ?'
+
+USER_PROGRESS_UPDATE = '''
+    UPDATE user_progress 
+    SET current_question = ?, last_updated = CURRENT_TIMESTAMP 
+    WHERE user_id = ?
+'''
+
+WRONG_QUESTIONS_QUERY = '''
+    SELECT 
+        q.id,
+        q.number,
+        q.title,
+        q.options,
+        q.answer,
+        w.wrong_count,
+        w.last_review_time,
+        w.due_at
+    FROM questions q 
+    JOIN wrong_answers w ON q.id = w.question_id 
+    WHERE w.user_id = ?
+    ORDER BY w.last_review_time DESC, w.wrong_count DESC
+'''
+
+WRONG_QUESTIONS_COUNT_QUERY = '''
+    SELECT COUNT(*) 
+    FROM wrong_answers 
+    WHERE user_id = ?
+'''
+
+NEXT_DUE_WRONG_QUESTION_QUERY = '''
+    SELECT w.question_id, q.number, w.due_at
+    FROM wrong_answers w
+    JOIN questions q ON q.id = w.question_id
+    WHERE w.user_id = ? AND w.question_id != ?
+    ORDER BY w.due_at
+    LIMIT 1
+'''
+
+# 错题练习提交后一次查询剩余到期错题数和下一道到期错题（不含当前题目），
+# 没有下一道错题时仍返回一行，后三列为 NULL
+PRACTICE_QUEUE_QUERY = f'''
+    SELECT
+        (SELECT COUNT(*) FROM wrong_answers WHERE user_id = ? AND due_at <= ?),
+        n.question_id, n.number, n.due_at
+    FROM (SELECT 1)
+    LEFT JOIN ({NEXT_DUE_WRONG_QUESTION_QUERY}) n
+'''
+
+QUESTIONS_FIRST_PAGE_QUERY = '''
+    SELECT * FROM questions 
+    WHERE number IS NOT NULL
+    ORDER BY number ASC
+    LIMIT ?
+'''
+
+QUESTIONS_AFTER_QUERY = '''
+    SELECT * FROM questions 
+    WHERE number > ?
+    ORDER BY number ASC
+    LIMIT ?
+'''
+
+# 需要检查执行计划的查询及示例参数
+HOT_QUERIES = {
+    'get_user_progress': (USER_PROGRESS_QUERY, (1,)),
+    'update_user_progress': (USER_PROGRESS_UPDATE, (1, 1)),
+    'get_wrong_questions': (WRONG_QUESTIONS_QUERY, (1,)),
+    'get_wrong_questions_count': (WRONG_QUESTIONS_COUNT_QUERY, (1,)),
+    'get_next_due_wrong_question': (NEXT_DUE_WRONG_QUESTION_QUERY, (1, 0)),
+    'answer_practice_question': (PRACTICE_QUEUE_QUERY, (1, 0, 1, 0)),
+    'get_questions_first_page': (QUESTIONS_FIRST_PAGE_QUERY, (50,)),
+    'get_questions_after': (QUESTIONS_AFTER_QUERY, (1, 50)),
+}
+
+def full_table_scans(plan):
+    """返回执行计划中全表扫描的步骤
+
+    plan 为 EXPLAIN QUERY PLAN 各步骤的描述。常量行以及计划中先行物化或作为协程执行的
+    子查询不是数据表，扫描它们不算全表扫描；子查询内部的步骤仍会逐条检查。
+    """
+    derived = {step.split(' ', 1)[1] for step in plan if step.startswith(('MATERIALIZE ', 'CO-ROUTINE '))}
+    return [
+        step for step in plan
+        if step.startswith('SCAN ')
+        and step != 'SCAN CONSTANT ROW'
+        and step.split()[1] not in derived
+    ]
+
+# 选项列以 JSON 数组存储，meta 表中 options_format 记录当前存储格式
+OPTIONS_FORMAT_JSON = 1
+
+def encode_options(options):
+    """将选项列表编码为数据库存储格式"""
+    return json.dumps(list(options), ensure_ascii=False)
+
+def decode_options(raw):
+    """将数据库中的选项解码为列表"""
+    return json.loads(raw)
+
+# 错题练习的 SM-2 间隔重复参数，答对按质量 4 计算，答错按质量 1 计算
+SM2_INITIAL_EASE = 2.5
+SM2_MIN_EASE = 1.3
+SM2_CORRECT_QUALITY = 4
+SM2_WRONG_QUALITY = 1
+
+def sm2_ease_delta(quality):
+    """按 SM-2 公式根据作答质量（0-5）计算难度系数的变化量"""
+    return 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+
+def sm2_ease_sql(quality):
+    """按作答质量调整 ease 列的 SQL 表达式，结果不低于 SM2_MIN_EASE"""
+    return f'MAX({SM2_MIN_EASE}, ease + {sm2_ease_delta(quality):.2f})'
+
+# 再答对一次后的复习间隔（天）：第 1、2 次连续答对为 1 天和 6 天，之后为上次间隔乘以新的难度系数
+SM2_NEXT_INTERVAL_SQL = f'''CASE repetitions
+            WHEN 0 THEN 1
+            WHEN 1 THEN 6
+            ELSE interval_days * {sm2_ease_sql(SM2_CORRECT_QUALITY)}
+        END'''
+
+# 合并错题记录；答错后重新开始间隔重复，难度系数下调，立即到期
+WRONG_ANSWER_UPSERT = f'''
+    INSERT INTO wrong_answers 
+    (user_id, question_id, wrong_count, last_review_time, due_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, question_id) DO UPDATE SET
+        wrong_count = wrong_count + excluded.wrong_count,
+        last_review_time = excluded.last_review_time,
+        ease = {sm2_ease_sql(SM2_WRONG_QUALITY)},
+        interval_days = 0,
+        repetitions = 0,
+        due_at = excluded.due_at
+'''
+
+# 答对错题后按 SM-2 安排下次复习，新的难度系数和间隔在语句中由当前值算出；
+# 连续答对次数将达到毕业次数的记录不更新
+WRONG_ANSWER_REVIEW_UPDATE = f'''
+    UPDATE wrong_answers SET
+        ease = {sm2_ease_sql(SM2_CORRECT_QUALITY)},
+        interval_days = {SM2_NEXT_INTERVAL_SQL},
+        repetitions = repetitions + 1,
+        due_at = ? + ({SM2_NEXT_INTERVAL_SQL}) * 86400,
+        last_review_time = ?
+    WHERE user_id = ? AND question_id = ? AND repetitions + 1 < ?
+'''
+
+def question_hash(title, options, answer):
+    """计算题目内容（题干、选项、答案）的哈希，用于增量同步时判断题目是否变化"""
+    content = json.dumps([title, list(options), answer], ensure_ascii=False)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class QuestionSnapshot:
+    """题库只读快照
+
+    按题号和ID建立索引，选项在构建时预先解析。快照构建完成后不再修改，
+    更新题库时整体替换为新的快照。
+    """
+    def __init__(self, version, rows):
+        self.version = version
+        self.by_number = {}
+        self.by_id = {}
+        for row in rows:
+            question = {
+                'id': row[0],
+                'number': row[1],
+                'title': row[2],
+                'options': decode_options(row[3]),
+                'answer': row[4]
+            }
+            self.by_id[question['id']] = question
+            if question['number'] is not None:
+                self.by_number[question['number']] = question
+        # 排好序的题号，用于把页码换算为键集分页的起点
+        self.numbers = sorted(self.by_number)
+
+    def __len__(self):
+        return len(self.by_id)
+
+class UserStateCache:
+    """用户角色和进度的进程内缓存
+
+    条目在 ttl 秒后过期，最多保留 max_entries 个用户，超出时淘汰最久未使用的条目。
+    本进程内的写入会直接更新或失效对应条目，其他进程的修改最迟在 ttl 秒后生效。
+    """
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, field):
+        """获取缓存的字段值，未缓存或已过期时返回 None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry['loaded_at'] > self.ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry.get(field)
+
+    def set(self, user_id, field, value):
+        """缓存字段值，同一用户的各字段共享过期时间"""
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry['loaded_at'] > self.ttl:
+                entry = {'loaded_at': time.monotonic()}
+                self._entries[user_id] = entry
+            entry[field] = value
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        """失效指定用户的缓存，不指定用户时清空全部"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
 
 class Database:
     def __init__(self, config):
         self.config = config
         self.database = config.DATABASE_FILE
         
-        # 配置日志
+        # 日志处理器由 log_setup.setup_logging 统一配置
         self.logger = logging.getLogger('database')
-        self.logger.setLevel(getattr(logging, config.LOG_LEVEL))
         
-        # 文件处理器
-        file_handler = logging.FileHandler(config.LOG_FILE, encoding='utf-8')
-        file_handler.setFormatter(logging.Formatter(config.LOG_FORMAT))
-        self.logger.addHandler(file_handler)
+        # 每个线程持有一个长连接
+        self._local = threading.local()
+        
+        # 题库快照，进程内共享
+        self._snapshot = None
+        self._snapshot_checked_at = 0
+        self._snapshot_lock = threading.Lock()
+        self._bank_listeners = []
         
-        # 控制台处理器
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setFormatter(logging.Formatter(config.LOG_FORMAT))
-        self.logger.addHandler(console_handler)
+        # 用户角色和进度缓存，避免每个请求都查询数据库
+        self.user_cache = UserStateCache(config.USER_CACHE_TTL, config.USER_CACHE_SIZE)
+        
+        # 写后缓冲：进度和错题增量先记在内存中，定时或累计一定次数后在一个事务内写入
+        self.write_behind = config.DATABASE_WRITE_BEHIND_MS > 0
+        self._pending_progress = {}  # {用户ID: 题号}
+        self._pending_wrong = {}  # {(用户ID, 题目ID): [错误次数, 最后答错时间]}
+        self._pending_events = 0
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_event = threading.Event()
         
         self._create_tables()
+        self._migrate_options_format()
+        self._migrate_review_schedule()
+        self._migrate_indexes()
+        self._check_query_plans()
+        
+        if self.write_behind:
+            threading.Thread(target=self._flush_loop, name='database-write-behind', daemon=True).start()
+            # 进程正常退出时写入缓冲中剩余的数据
+            atexit.register(self.flush)
+
+    def _connect(self):
+        """创建数据库连接并应用 PRAGMA 配置"""
+        journal_mode = self.config.DATABASE_JOURNAL_MODE.upper()
+        synchronous = self.config.DATABASE_SYNCHRONOUS.upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"无效的 journal_mode: {journal_mode}")
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"无效的 synchronous: {synchronous}")
+        
+        # 开启指标统计时使用统计每条语句耗时的连接
+        factory = InstrumentedConnection if self.config.METRICS_ENABLED else sqlite3.Connection
+        conn = sqlite3.connect(self.database, timeout=self.config.DATABASE_BUSY_TIMEOUT / 1000, factory=factory)
+        conn.execute(f'PRAGMA journal_mode = {journal_mode}')
+        conn.execute(f'PRAGMA synchronous = {synchronous}')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.config.DATABASE_BUSY_TIMEOUT)}')
+        conn.execute(f'PRAGMA cache_size = {int(self.config.DATABASE_CACHE_SIZE)}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.config.DATABASE_MMAP_SIZE)}')
+        return conn
 
     def get_db(self):
-        """获取当前线程的数据库连接"""
-        if not hasattr(g, 'sqlite_db'):
-            g.sqlite_db = sqlite3.connect(self.database)
-        return g.sqlite_db
+        """获取当前线程的数据库连接，连接在线程内长期复用"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def release_db(self):
+        """请求结束时回滚未提交的事务，连接保留供后续请求复用"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
 
     def _create_tables(self):
         """创建数据库表"""
-        conn = sqlite3.connect(self.database)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # 检查是否需要清理数据库
@@ -48,6 +332,9 @@ class Database:
             cursor.execute("DROP TABLE IF EXISTS user_progress")
             cursor.execute("DROP TABLE IF EXISTS users")
             cursor.execute("DROP TABLE IF EXISTS questions")
+            cursor.execute("DROP TABLE IF EXISTS meta")
+            cursor.execute("DROP TABLE IF EXISTS jobs")
+            cursor.execute("DROP TABLE IF EXISTS exam_papers")
             conn.commit()
             self.logger.info("数据库清理完成")
         else:
@@ -55,12 +342,12 @@ class Database:
             cursor.execute('''
                 SELECT name FROM sqlite_master 
                 WHERE type='table' AND 
-                name IN ('users', 'user_progress', 'questions', 'wrong_answers')
+                name IN ('users', 'user_progress', 'questions', 'wrong_answers', 'meta', 'jobs', 'exam_papers')
             ''')
             existing_tables = {row[0] for row in cursor.fetchall()}
             
             # 如果所有表都存在，则直接返回
-            if len(existing_tables) == 4:
+            if len(existing_tables) == 7:
                 conn.close()
                 return
 
@@ -117,6 +404,10 @@ class Database:
             question_id INTEGER NOT NULL,
             wrong_count INTEGER DEFAULT 1,
             last_review_time TIMESTAMP,
+            ease REAL NOT NULL DEFAULT 2.5,  -- SM-2 难度系数
+            interval_days REAL NOT NULL DEFAULT 0,  -- 当前复习间隔（天）
+            repetitions INTEGER NOT NULL DEFAULT 0,  -- 连续答对次数
+            due_at REAL NOT NULL DEFAULT 0,  -- 下次复习时间（Unix 时间戳）
             FOREIGN KEY (question_id) REFERENCES questions (id),
             FOREIGN KEY (user_id) REFERENCES users (id),
             UNIQUE(user_id, question_id)
@@ -124,75 +415,416 @@ class Database:
         ''')
         self.logger.debug("错题记录表创建完成")
         
+        # 创建元数据表，记录题库版本等信息
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        ''')
+        self.logger.debug("元数据表创建完成")
+        
+        # 创建后台任务表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',  -- 任务状态: running, succeeded, failed
+            pages_done INTEGER NOT NULL DEFAULT 0,
+            pages_total INTEGER NOT NULL DEFAULT 0,
+            questions_saved INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        ''')
+        self.logger.debug("后台任务表创建完成")
+        
+        # 创建模拟考试试卷表，答案只保存在服务端
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS exam_papers (
+            id TEXT PRIMARY KEY,
+            questions TEXT NOT NULL,  -- JSON: [[题目ID, 选项排列, 正确选项位置], ...]
+            expires_at REAL NOT NULL  -- Unix 时间戳
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_exam_papers_expires_at ON exam_papers (expires_at)')
+        self.logger.debug("试卷表创建完成")
+        
         conn.commit()
         conn.close()
         self.logger.info("所有数据库表创建完成")
 
+    def _migrate_options_format(self):
+        """将旧版以 str(list) 存储的选项一次性迁移为 JSON 格式"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT value FROM meta WHERE key = 'options_format'")
+            result = cursor.fetchone()
+            if result and result[0] == OPTIONS_FORMAT_JSON:
+                return
+            
+            cursor.execute('SELECT id, options FROM questions')
+            updates = []
+            for question_id, raw in cursor.fetchall():
+                try:
+                    json.loads(raw)
+                except ValueError:
+                    # 旧格式为 Python 列表字面量，使用 literal_eval 安全解析
+                    updates.append((encode_options(ast.literal_eval(raw)), question_id))
+            
+            cursor.executemany('UPDATE questions SET options = ? WHERE id = ?', updates)
+            cursor.execute('''
+                INSERT INTO meta (key, value) VALUES ('options_format', ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            ''', (OPTIONS_FORMAT_JSON,))
+            if updates:
+                self._bump_bank_version(cursor)
+            conn.commit()
+            self.logger.info("选项存储格式迁移完成，共转换 %s 道题目", len(updates))
+        finally:
+            conn.close()
+
+    def _migrate_review_schedule(self):
+        """为旧的错题记录表补充间隔重复所需的列，已有错题视为立即到期
+
+        多个工作进程同时启动时都会执行迁移，先取得写锁再检查表结构，
+        后取得锁的进程会看到已添加的列，不会重复添加
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(wrong_answers)')}
+            for name, definition in [
+                ('ease', f'REAL NOT NULL DEFAULT {SM2_INITIAL_EASE}'),
+                ('interval_days', 'REAL NOT NULL DEFAULT 0'),
+                ('repetitions', 'INTEGER NOT NULL DEFAULT 0'),
+                ('due_at', 'REAL NOT NULL DEFAULT 0'),
+            ]:
+                if name not in columns:
+                    conn.execute(f'ALTER TABLE wrong_answers ADD COLUMN {name} {definition}')
+                    self.logger.info("错题记录表新增列 %s", name)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _migrate_indexes(self):
+        """创建高频查询所需的索引"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            # 唯一索引前先清理重复的进度记录，保留最新的一条
+            cursor.execute('''
+                DELETE FROM user_progress
+                WHERE id NOT IN (SELECT MAX(id) FROM user_progress GROUP BY user_id)
+            ''')
+            if cursor.rowcount:
+                self.logger.warning("清理重复的用户进度记录 %s 条", cursor.rowcount)
+            
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_user_progress_user_id
+                ON user_progress (user_id)
+            ''')
+            # 错题列表按复习时间和错误次数排序
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_wrong_answers_user_review
+                ON wrong_answers (user_id, last_review_time DESC, wrong_count DESC)
+            ''')
+            # 错题练习按到期时间取下一题
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_wrong_answers_user_due
+                ON wrong_answers (user_id, due_at)
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def explain_query_plans(self):
+        """返回高频查询的执行计划，键为查询名称，值为计划描述列表"""
+        conn = self._connect()
+        try:
+            return {
+                name: [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+                for name, (sql, params) in HOT_QUERIES.items()
+            }
+        finally:
+            conn.close()
+
+    def _check_query_plans(self):
+        """检查高频查询是否退化为全表扫描"""
+        for name, plan in self.explain_query_plans().items():
+            if full_table_scans(plan):
+                self.logger.warning("查询 %s 未使用索引: %s", name, plan)
+
     def add_question(self, title, options, answer, number=None):
         """添加或更新题目"""
         conn = self.get_db()
         cursor = conn.cursor()
         
-        # 使用 INSERT OR REPLACE 来处理重复的题号
+        # 题号重复时原地更新，保持题目ID不变，避免错题记录失去关联
         cursor.execute('''
-            INSERT OR REPLACE INTO questions 
+            INSERT INTO questions 
             (number, title, options, answer) 
             VALUES (?, ?, ?, ?)
-        ''', (number, title, str(options), answer))
+            ON CONFLICT(number) DO UPDATE SET
+                title = excluded.title,
+                options = excluded.options,
+                answer = excluded.answer
+        ''', (number, title, encode_options(options), answer))
+        self._bump_bank_version(cursor)
         
         conn.commit()
+        self._invalidate_snapshot()
 
-    def record_wrong_answer(self, user_id, question_id):
-        """记录错题"""
+    def bulk_upsert_questions(self, questions, batch_size=500):
+        """批量导入题目
+
+        在一个事务内按题号新增或原地更新题目，题目ID保持不变。
+        返回新增、更新和未变化的题目数量。
+        """
         conn = self.get_db()
         cursor = conn.cursor()
-        now = datetime.now()
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
         
-        # 先检查是否已存在记录
-        cursor.execute('''
-            SELECT wrong_count FROM wrong_answers 
-            WHERE user_id = ? AND question_id = ?
-        ''', (user_id, question_id))
+        cursor.execute('SELECT number, title, options, answer FROM questions WHERE number IS NOT NULL')
+        existing = {row[0]: row[1:] for row in cursor.fetchall()}
+        
+        inserts = []
+        updates = []
+        
+        def flush():
+            cursor.executemany('''
+                INSERT INTO questions (number, title, options, answer)
+                VALUES (?, ?, ?, ?)
+            ''', inserts)
+            cursor.executemany('''
+                UPDATE questions SET title = ?, options = ?, answer = ?
+                WHERE number = ?
+            ''', updates)
+            inserts.clear()
+            updates.clear()
+        
+        try:
+            for question in questions:
+                number = question['number']
+                row = (question['title'], encode_options(question['options']), question['answer'])
+                current = existing.get(number)
+                
+                if current is None:
+                    inserts.append((number,) + row)
+                    counts['inserted'] += 1
+                elif current != row:
+                    updates.append(row + (number,))
+                    counts['updated'] += 1
+                else:
+                    counts['unchanged'] += 1
+                existing[number] = row
+                
+                if len(inserts) + len(updates) >= batch_size:
+                    flush()
+            flush()
+            
+            if counts['inserted'] or counts['updated']:
+                self._bump_bank_version(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
         
+        self._invalidate_snapshot()
+        self.logger.info(
+            "批量导入题目完成: 新增 %s, 更新 %s, 未变化 %s",
+            counts['inserted'], counts['updated'], counts['unchanged'])
+        return counts
+
+    def get_question_hashes(self):
+        """获取题库中每道题目的内容哈希，键为题号"""
+        return {
+            number: question_hash(q['title'], q['options'], q['answer'])
+            for number, q in self.get_question_snapshot().by_number.items()
+        }
+
+    def delete_questions(self, numbers):
+        """按题号删除题目及其错题记录"""
+        self.flush()
+        numbers = list(numbers)
+        if not numbers:
+            return 0
+        
+        conn = self.get_db()
+        cursor = conn.cursor()
+        params = [(number,) for number in numbers]
+        try:
+            cursor.executemany('''
+                DELETE FROM wrong_answers
+                WHERE question_id IN (SELECT id FROM questions WHERE number = ?)
+            ''', params)
+            cursor.executemany('DELETE FROM questions WHERE number = ?', params)
+            self._bump_bank_version(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        self._invalidate_snapshot()
+        self.logger.info("已删除 %s 道题目", len(numbers))
+        return len(numbers)
+
+    def _bump_bank_version(self, cursor):
+        """递增题库版本号，需与题目写入在同一事务中调用"""
+        cursor.execute('''
+            INSERT INTO meta (key, value) VALUES ('bank_version', 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + 1
+        ''')
+
+    def get_bank_version(self):
+        """获取数据库中的题库版本号"""
+        conn = self.get_db()
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM meta WHERE key = 'bank_version'")
         result = cursor.fetchone()
-        if result:
-            # 如果存在，更新错误次数
-            cursor.execute('''
-                UPDATE wrong_answers 
-                SET wrong_count = wrong_count + 1,
-                    last_review_time = ?
-                WHERE user_id = ? AND question_id = ?
-            ''', (now, user_id, question_id))
-        else:
-            # 如果不存在，创建新记录
-            cursor.execute('''
-                INSERT INTO wrong_answers 
-                (user_id, question_id, wrong_count, last_review_time)
-                VALUES (?, ?, 1, ?)
-            ''', (user_id, question_id, now))
+        return result[0] if result else 0
+
+    def on_bank_change(self, callback):
+        """注册题库变化回调，本进程写入题目或发现其他进程更新题库后调用"""
+        self._bank_listeners.append(callback)
+
+    def _notify_bank_change(self):
+        """通知题库已变化"""
+        for callback in self._bank_listeners:
+            callback()
+
+    def _invalidate_snapshot(self):
+        """使本进程的题库快照在下次访问时重新校验版本"""
+        self._snapshot_checked_at = 0
+        self._notify_bank_change()
+
+    def get_question_snapshot(self):
+        """获取题库快照
+
+        快照在本进程内共享。每隔 QUESTION_SNAPSHOT_TTL 秒校验一次数据库中的
+        题库版本号，其他工作进程更新题库后，本进程最迟在该间隔后重建快照。
+        """
+        snapshot = self._snapshot
+        if (snapshot is not None and
+                time.monotonic() - self._snapshot_checked_at < self.config.QUESTION_SNAPSHOT_TTL):
+            return snapshot
+        
+        with self._snapshot_lock:
+            snapshot = self._snapshot
+            if (snapshot is not None and
+                    time.monotonic() - self._snapshot_checked_at < self.config.QUESTION_SNAPSHOT_TTL):
+                return snapshot
+            
+            version = self.get_bank_version()
+            if snapshot is None or snapshot.version != version:
+                conn = self.get_db()
+                cursor = conn.cursor()
+                cursor.execute('SELECT id, number, title, options, answer FROM questions')
+                snapshot = QuestionSnapshot(version, cursor.fetchall())
+                self._snapshot = snapshot
+                self.logger.info("题库快照已重建: 版本=%s, 题目数=%s", version, len(snapshot))
+                self._notify_bank_change()
+            self._snapshot_checked_at = time.monotonic()
+            return snapshot
+
+    def _schedule_flush(self):
+        """缓冲的事件数达到上限时唤醒写入线程"""
+        if self._pending_events >= self.config.DATABASE_WRITE_BEHIND_MAX_EVENTS:
+            self._flush_event.set()
+
+    def _flush_loop(self):
+        """写后缓冲的写入线程，每隔 DATABASE_WRITE_BEHIND_MS 毫秒或被唤醒时写入一次"""
+        interval = self.config.DATABASE_WRITE_BEHIND_MS / 1000
+        while True:
+            self._flush_event.wait(interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error("写入缓冲数据失败: %s", e)
+
+    def flush(self):
+        """在一个事务内写入缓冲中的进度和错题
+
+        读取错题或直接修改进度前需先调用，保证读到本进程已提交的全部答题结果。
+        写入失败时数据放回缓冲，等待下次写入。
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                progress, self._pending_progress = self._pending_progress, {}
+                wrong, self._pending_wrong = self._pending_wrong, {}
+                self._pending_events = 0
+            if not progress and not wrong:
+                return
+            
+            conn = self.get_db()
+            try:
+                cursor = conn.cursor()
+                cursor.executemany(USER_PROGRESS_UPDATE, [(number, user_id) for user_id, number in progress.items()])
+                cursor.executemany(WRONG_ANSWER_UPSERT, [
+                    (user_id, question_id, count, last_time, last_time.timestamp())
+                    for (user_id, question_id), (count, last_time) in wrong.items()
+                ])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                # 放回缓冲，缓冲期间产生的新数据优先
+                with self._pending_lock:
+                    for user_id, number in progress.items():
+                        self._pending_progress.setdefault(user_id, number)
+                    for key, (count, last_time) in wrong.items():
+                        pending = self._pending_wrong.setdefault(key, [0, last_time])
+                        pending[0] += count
+                raise
+            self.logger.debug("已写入缓冲数据: %s 条进度, %s 条错题", len(progress), len(wrong))
+
+    def record_wrong_answer(self, user_id, question_id, count=1):
+        """记录错题"""
+        self.record_wrong_answers(user_id, {question_id: count})
+
+    def record_wrong_answers(self, user_id, wrong_counts):
+        """批量记录错题
+
+        wrong_counts 为 {题目ID: 错误次数}，在一个事务内合并到错题记录中，
+        开启写后缓冲时先记入缓冲
+        """
+        now = datetime.now()
+        if self.write_behind:
+            with self._pending_lock:
+                for question_id, count in wrong_counts.items():
+                    if count <= 0:
+                        continue
+                    pending = self._pending_wrong.setdefault((user_id, int(question_id)), [0, now])
+                    pending[0] += count
+                    pending[1] = now
+                self._pending_events += 1
+            self._schedule_flush()
+            return
+        
+        conn = self.get_db()
+        cursor = conn.cursor()
+        
+        cursor.executemany(WRONG_ANSWER_UPSERT, [
+            (user_id, int(question_id), count, now, now.timestamp())
+            for question_id, count in wrong_counts.items() if count > 0
+        ])
         
         conn.commit()
 
     def get_wrong_questions(self, user_id):
         """获取用户的错题"""
+        self.flush()
         conn = self.get_db()
         cursor = conn.cursor()
         
-        # 修改查询语句，确保获取正确的错误次数
-        cursor.execute('''
-            SELECT 
-                q.id,
-                q.number,
-                q.title,
-                q.options,
-                q.answer,
-                w.wrong_count,
-                w.last_review_time
-            FROM questions q 
-            JOIN wrong_answers w ON q.id = w.question_id 
-            WHERE w.user_id = ?
-            ORDER BY w.last_review_time DESC, w.wrong_count DESC
-        ''', (user_id,))
+        cursor.execute(WRONG_QUESTIONS_QUERY, (user_id,))
         
         questions = cursor.fetchall()
         formatted_questions = []
@@ -201,54 +833,57 @@ class Database:
                 'id': q[0],
                 'number': q[1],
                 'title': q[2],
-                'options': eval(q[3]),
+                'options': decode_options(q[3]),
                 'answer': q[4],
                 'wrong_count': q[5],
-                'last_review_time': q[6]
+                'last_review_time': q[6],
+                'due_at': datetime.fromtimestamp(q[7])
             })
         return formatted_questions
 
     def get_questions(self, limit=None):
-        """获取题目，可选择限制数量"""
-        conn = self.get_db()
-        cursor = conn.cursor()
-        
+        """获取题目，可选择限制数量
+
+        指定数量时从题库快照中随机抽取且不重复，题目选项已打乱；不指定时按题号返回全部题目
+        """
+        snapshot = self.get_question_snapshot()
         if limit:
-            cursor.execute('SELECT * FROM questions ORDER BY RANDOM() LIMIT ?', (limit,))
-        else:
-            cursor.execute('SELECT * FROM questions ORDER BY number')  # 按题号排序
-        
-        questions = cursor.fetchall()
+            question_ids = random.sample(list(snapshot.by_id), min(limit, len(snapshot)))
+            return [self._shuffle_question(snapshot.by_id[question_id]) for question_id in question_ids]
         
-        # 将数据库记录转换为字典格式
-        formatted_questions = []
-        for q in questions:
-            formatted_questions.append({
-                'id': q[0],
-                'number': q[1],  # 添加题号
-                'title': q[2],
-                'options': eval(q[3]),
-                'answer': q[4]
-            })
-        return formatted_questions
+        # 按题号排序
+        return [dict(question, options=list(question['options']))
+                for question in sorted(snapshot.by_id.values(),
+                                       key=lambda q: (q['number'] is not None, q['number'] or 0))]
 
     def get_questions_count(self):
-        """获取题目总数"""
-        conn = self.get_db()
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM questions')
-        return cursor.fetchone()[0]
+        """获取题目总数，取自题库快照，题库变化时随快照一同更新"""
+        return len(self.get_question_snapshot())
 
     def get_questions_page(self, page=1, per_page=20):
-        """获取分页的题目"""
+        """获取分页的题目
+
+        通过快照中排好序的题号找到该页第一题的前一个题号，再按题号做键集分页，
+        避免 OFFSET 逐行跳过，任意页的查询代价相同。
+        """
+        if page < 1:
+            return []
+        
+        numbers = self.get_question_snapshot().numbers
+        offset = (page - 1) * per_page
+        if offset >= len(numbers):
+            return []
+        after_number = numbers[offset - 1] if offset > 0 else None
+        return self.get_questions_after(after_number, per_page)
+
+    def get_questions_after(self, after_number=None, limit=20):
+        """按题号键集分页，获取题号大于 after_number 的 limit 道题目"""
         conn = self.get_db()
         cursor = conn.cursor()
-        offset = (page - 1) * per_page
-        cursor.execute('''
-            SELECT * FROM questions 
-            ORDER BY number ASC
-            LIMIT ? OFFSET ?
-        ''', (per_page, offset))
+        if after_number is None:
+            cursor.execute(QUESTIONS_FIRST_PAGE_QUERY, (limit,))
+        else:
+            cursor.execute(QUESTIONS_AFTER_QUERY, (after_number, limit))
         
         questions = cursor.fetchall()
         formatted_questions = []
@@ -257,81 +892,61 @@ class Database:
                 'id': q[0],
                 'number': q[1],
                 'title': q[2],
-                'options': eval(q[3]),
+                'options': decode_options(q[3]),
                 'answer': q[4]
             })
-        return formatted_questions 
+        return formatted_questions
+
+    def _shuffle_question(self, question):
+        """复制快照中的题目并打乱选项顺序"""
+        options = question['options']
+        
+        # 打乱选项顺序，permutation[i] 为打乱后第 i 个选项的原始位置
+        permutation = list(range(len(options)))
+        random.shuffle(permutation)
+        shuffled_options = [options[i] for i in permutation]
+        
+        # 获取答案在打乱后的新索引
+        new_answer_index = shuffled_options.index(question['answer'])
+        
+        return {
+            'id': question['id'],
+            'number': question['number'],
+            'title': question['title'],
+            'options': shuffled_options,
+            'answer': question['answer'],
+            'answer_index': new_answer_index,
+            'permutation': permutation
+        }
 
     def get_question_by_number(self, number):
         """根据题号获取题目"""
         try:
-            conn = self.get_db()
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM questions WHERE number = ?', (number,))
-            question = cursor.fetchone()
+            question = self.get_question_snapshot().by_number.get(number)
             
-            self.logger.debug(f"查询题号 {number} 结果: {question}")
+            self.logger.debug("查询题号 %s 结果: %s", number, question)
             
             if question:
-                # 获取选项和答案
-                options = eval(question[3])
-                answer = question[4]
-                
-                # 记录答案的原始索引
-                answer_index = options.index(answer)
-                
-                # 打乱选项顺序
-                shuffled_options = options.copy()
-                random.shuffle(shuffled_options)
-                
-                # 获取答案在打乱后的新索引
-                new_answer_index = shuffled_options.index(answer)
-                
-                return {
-                    'id': question[0],
-                    'number': question[1],
-                    'title': question[2],
-                    'options': shuffled_options,
-                    'answer': answer,
-                    'answer_index': new_answer_index
-                }
+                return self._shuffle_question(question)
             return None
             
         except Exception as e:
-            self.logger.error(f"获取题目出错: {str(e)}")
+            self.logger.error("获取题目出错: %s", e)
             return None
 
-    def get_question_by_id(self, question_id):
-        """根据ID获取题目"""
-        conn = self.get_db()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM questions WHERE id = ?', (question_id,))
-        question = cursor.fetchone()
+    def get_question_by_id(self, question_id, shuffle=True):
+        """根据ID获取题目，shuffle 为 False 时按原始顺序返回选项"""
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            return None
         
-        if question:
-            # 获取选项和答案
-            options = eval(question[3])
-            answer = question[4]
-            
-            # 记录答案的原始索引
-            answer_index = options.index(answer)
-            
-            # 打乱选项顺序
-            shuffled_options = options.copy()
-            random.shuffle(shuffled_options)
-            
-            # 获取答案在打乱后的新索引
-            new_answer_index = shuffled_options.index(answer)
-            
-            return {
-                'id': question[0],
-                'number': question[1],
-                'title': question[2],
-                'options': shuffled_options,
-                'answer': answer,
-                'answer_index': new_answer_index
-            }
-        return None
+        question = self.get_question_snapshot().by_id.get(question_id)
+        if not question:
+            return None
+        if shuffle:
+            return self._shuffle_question(question)
+        return dict(question, options=list(question['options']))
 
     def get_or_create_user(self, username):
         """获取或创建用户"""
@@ -344,7 +959,7 @@ class Database:
             user = cursor.fetchone()
             if user:
                 # 确保超级管理员也有进度记录
-                cursor.execute('SELECT * FROM user_progress WHERE user_id = ?', (user[0],))
+                cursor.execute(USER_PROGRESS_QUERY, (user[0],))
                 if not cursor.fetchone():
                     cursor.execute('''
                         INSERT INTO user_progress (user_id, current_question)
@@ -359,7 +974,7 @@ class Database:
                     'created_at': user[3]
                 }
             else:
-                self.logger.warning(f"尝试使用超级管理员用户名 {username} 创建普通用户")
+                self.logger.warning("尝试使用超级管理员用户名 %s 创建普通用户", username)
                 return None
         
         # 非超级管理员用户名，获取或创建用户
@@ -373,7 +988,7 @@ class Database:
         user = cursor.fetchone()
         
         # 初始化用户进度
-        cursor.execute('SELECT * FROM user_progress WHERE user_id = ?', (user[0],))
+        cursor.execute(USER_PROGRESS_QUERY, (user[0],))
         if not cursor.fetchone():
             cursor.execute('''
                 INSERT INTO user_progress (user_id, current_question)
@@ -390,33 +1005,46 @@ class Database:
 
     def get_user_progress(self, user_id):
         """获取用户进度"""
+        progress = self.user_cache.get(user_id, 'progress')
+        if progress is not None:
+            return progress
+        with self._pending_lock:
+            progress = self._pending_progress.get(user_id)
+        if progress is not None:
+            return progress
+        
         conn = self.get_db()
         cursor = conn.cursor()
-        cursor.execute('SELECT current_question FROM user_progress WHERE user_id = ?', (user_id,))
+        cursor.execute(USER_PROGRESS_QUERY, (user_id,))
         result = cursor.fetchone()
-        return result[0] if result else 1
+        progress = result[0] if result else 1
+        self.user_cache.set(user_id, 'progress', progress)
+        return progress
 
     def update_user_progress(self, user_id, question_number):
-        """更新用户进度"""
+        """更新用户进度，开启写后缓冲时先记入缓冲"""
+        if self.write_behind:
+            with self._pending_lock:
+                self._pending_progress[user_id] = question_number
+                self._pending_events += 1
+            self.user_cache.set(user_id, 'progress', question_number)
+            self._schedule_flush()
+            return
+        
         conn = self.get_db()
         cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE user_progress 
-            SET current_question = ?, last_updated = CURRENT_TIMESTAMP 
-            WHERE user_id = ?
-        ''', (question_number, user_id))
+        cursor.execute(USER_PROGRESS_UPDATE, (question_number, user_id))
         conn.commit()
+        self.user_cache.set(user_id, 'progress', question_number)
 
     def reset_user_progress(self, user_id, question_number):
         """重置用户进度到指定题号"""
+        self.flush()
         conn = self.get_db()
         cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE user_progress 
-            SET current_question = ?, last_updated = CURRENT_TIMESTAMP 
-            WHERE user_id = ?
-        ''', (question_number, user_id))
-        conn.commit() 
+        cursor.execute(USER_PROGRESS_UPDATE, (question_number, user_id))
+        conn.commit()
+        self.user_cache.set(user_id, 'progress', question_number)
 
     def get_all_users(self):
         """获取所有用户"""
@@ -432,121 +1060,202 @@ class Database:
         cursor = conn.cursor()
         cursor.execute('UPDATE users SET role = ? WHERE id = ?', (role, user_id))
         conn.commit()
+        self.user_cache.invalidate(user_id)
 
     def get_user_role(self, user_id):
-        """获取用户角色"""
+        """获取用户角色，结果在 USER_CACHE_TTL 秒内缓存"""
+        role = self.user_cache.get(user_id, 'role')
+        if role is not None:
+            return role
+        
         conn = self.get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT role FROM users WHERE id = ?', (user_id,))
         result = cursor.fetchone()
-        return result[0] if result else None 
+        role = result[0] if result else None
+        if role is not None:
+            self.user_cache.set(user_id, 'role', role)
+        return role
 
-    def remove_wrong_question(self, user_id, question_id):
-        """从错题记录中移除一道题目"""
-        conn = self.get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            DELETE FROM wrong_answers 
-            WHERE user_id = ? AND question_id = ?
-        ''', (user_id, question_id))
-        
-        conn.commit()
-    
     def get_wrong_questions_count(self, user_id):
         """获取用户的错题数量"""
+        self.flush()
         conn = self.get_db()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT COUNT(*) 
-            FROM wrong_answers 
-            WHERE user_id = ?
-        ''', (user_id,))
+        cursor.execute(WRONG_QUESTIONS_COUNT_QUERY, (user_id,))
         
         return cursor.fetchone()[0]
     
-    def get_next_wrong_question(self, user_id, current_number):
-        """获取下一道错题"""
+    def _review_wrong_question(self, cursor, user_id, question_id, now):
+        """按 SM-2 安排答对的错题的下次复习，连续答对 PRACTICE_GRADUATE_AFTER 次后移出错题
+
+        复习安排由一条 UPDATE 算出，不必先读取当前的难度系数和间隔；
+        UPDATE 未匹配（达到毕业次数）时才执行 DELETE
+        """
+        cursor.execute(WRONG_ANSWER_REVIEW_UPDATE, (
+            now.timestamp(), now, user_id, question_id, self.config.PRACTICE_GRADUATE_AFTER))
+        if cursor.rowcount == 0:
+            cursor.execute('''
+                DELETE FROM wrong_answers 
+                WHERE user_id = ? AND question_id = ?
+            ''', (user_id, question_id))
+
+    def answer_practice_question(self, user_id, question_id, correct):
+        """错题练习提交答案
+
+        在一个事务内更新该题的复习安排（答对按 SM-2 推迟或移出错题，答错重新计入错题），
+        并用一条查询同时取得剩余到期错题数和下一道到期错题。
+        返回 {'remaining': 到期错题数, 'next': {'id', 'number', 'due_at'} 或 None}，
+        下一道错题不包括当前题目，其 due_at 可能晚于当前时间
+        """
+        self.flush()
         conn = self.get_db()
         cursor = conn.cursor()
+        now = datetime.now()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            if correct:
+                self._review_wrong_question(cursor, user_id, question_id, now)
+            else:
+                cursor.execute(WRONG_ANSWER_UPSERT, (user_id, question_id, 1, now, now.timestamp()))
+            
+            cursor.execute(PRACTICE_QUEUE_QUERY, (user_id, now.timestamp(), user_id, question_id))
+            row = cursor.fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
         
-        # 先尝试获取比当前题号大的错题
-        cursor.execute('''
-            SELECT 
-                q.id,
-                q.number,
-                q.title,
-                q.options,
-                q.answer,
-                w.wrong_count
-            FROM questions q 
-            JOIN wrong_answers w ON q.id = w.question_id 
-            WHERE w.user_id = ? AND q.number > ?
-            ORDER BY q.number
-            LIMIT 1
-        ''', (user_id, current_number))
-        
-        question = cursor.fetchone()
+        return {
+            'remaining': row[0],
+            'next': {'id': row[1], 'number': row[2], 'due_at': row[3]} if row[1] is not None else None
+        }
+
+    def get_next_due_wrong_question(self, user_id, exclude_question_id=None):
+        """按到期时间获取最早需要复习的错题
+
+        通过 (user_id, due_at) 索引只读取一行，与错题数量无关。
+        返回 {'id', 'number', 'due_at'}，due_at 可能晚于当前时间，没有错题时返回 None
+        """
+        self.flush()
+        conn = self.get_db()
+        cursor = conn.cursor()
         
-        if not question:
-            # 如果没有更大题号的错题，则从头开始
+        cursor.execute(NEXT_DUE_WRONG_QUESTION_QUERY, (user_id, exclude_question_id or 0))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        return {'id': row[0], 'number': row[1], 'due_at': row[2]}
+
+    def create_job(self, kind, stale_seconds):
+        """创建后台任务，同类任务同一时间只允许运行一个
+
+        若已有心跳未超时的同类任务在运行，返回 (该任务ID, False)；
+        心跳超过 stale_seconds 秒的任务视为已中断并标记为失败。
+        """
+        conn = self.get_db()
+        cursor = conn.cursor()
+        try:
+            # 立即获取写锁，保证多个工作进程之间的检查和插入是原子的
+            cursor.execute('BEGIN IMMEDIATE')
             cursor.execute('''
-                SELECT 
-                    q.id,
-                    q.number,
-                    q.title,
-                    q.options,
-                    q.answer,
-                    w.wrong_count
-                FROM questions q 
-                JOIN wrong_answers w ON q.id = w.question_id 
-                WHERE w.user_id = ?
-                ORDER BY q.number
-                LIMIT 1
-            ''', (user_id,))
-            question = cursor.fetchone()
-        
-        if question:
-            return {
-                'id': question[0],
-                'number': question[1],
-                'title': question[2],
-                'options': eval(question[3]),
-                'answer': question[4],
-                'wrong_count': question[5]
-            }
-        return None 
+                UPDATE jobs
+                SET status = 'failed', message = '任务中断', finished_at = CURRENT_TIMESTAMP
+                WHERE kind = ? AND status = 'running'
+                  AND updated_at < datetime('now', ?)
+            ''', (kind, f'-{int(stale_seconds)} seconds'))
+            cursor.execute('''
+                SELECT id FROM jobs WHERE kind = ? AND status = 'running'
+                ORDER BY id DESC LIMIT 1
+            ''', (kind,))
+            running = cursor.fetchone()
+            if running:
+                conn.commit()
+                return running[0], False
+            
+            cursor.execute('INSERT INTO jobs (kind) VALUES (?)', (kind,))
+            job_id = cursor.lastrowid
+            conn.commit()
+            return job_id, True
+        except Exception:
+            conn.rollback()
+            raise
 
-    def get_first_wrong_question(self, user_id):
-        """获取用户的第一道错题"""
+    def update_job(self, job_id, finished=False, **fields):
+        """更新任务进度并刷新心跳时间，finished 为 True 时同时记录结束时间"""
+        columns = ''.join(f'{column} = ?, ' for column in fields)
+        if finished:
+            columns += 'finished_at = CURRENT_TIMESTAMP, '
+        conn = self.get_db()
+        cursor = conn.cursor()
+        cursor.execute(
+            f'UPDATE jobs SET {columns}updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+            (*fields.values(), job_id))
+        conn.commit()
+
+    def get_job(self, job_id):
+        """获取任务信息"""
         conn = self.get_db()
         cursor = conn.cursor()
-        
         cursor.execute('''
-            SELECT 
-                q.id,
-                q.number,
-                q.title,
-                q.options,
-                q.answer,
-                w.wrong_count
-            FROM questions q 
-            JOIN wrong_answers w ON q.id = w.question_id 
-            WHERE w.user_id = ?
-            ORDER BY q.number
-            LIMIT 1
-        ''', (user_id,))
-        
-        question = cursor.fetchone()
-        
-        if question:
+            SELECT id, kind, status, pages_done, pages_total, questions_saved,
+                   errors, message, created_at, updated_at, finished_at
+            FROM jobs WHERE id = ?
+        ''', (job_id,))
+        job = cursor.fetchone()
+        if job:
             return {
-                'id': question[0],
-                'number': question[1],
-                'title': question[2],
-                'options': eval(question[3]),
-                'answer': question[4],
-                'wrong_count': question[5]
+                'id': job[0],
+                'kind': job[1],
+                'status': job[2],
+                'pages_done': job[3],
+                'pages_total': job[4],
+                'questions_saved': job[5],
+                'errors': job[6],
+                'message': job[7],
+                'created_at': job[8],
+                'updated_at': job[9],
+                'finished_at': job[10]
             }
-        return None 
\ No newline at end of file
+        return None
+
+    def create_exam_paper(self, questions, lifetime):
+        """保存试卷每道题的题目ID、选项排列和正确选项位置，返回随机生成的试卷ID
+
+        页面中只有试卷ID，答案不会发送到客户端。试卷 lifetime 秒后失效，
+        创建试卷时顺带清理已失效的试卷
+        """
+        paper_id = secrets.token_urlsafe(16)
+        now = time.time()
+        paper = [[question['id'], question['permutation'], question['answer_index']] for question in questions]
+        conn = self.get_db()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM exam_papers WHERE expires_at <= ?', (now,))
+        cursor.execute('''
+            INSERT INTO exam_papers (id, questions, expires_at) VALUES (?, ?, ?)
+        ''', (paper_id, json.dumps(paper), now + lifetime))
+        conn.commit()
+        return paper_id
+
+    def take_exam_paper(self, paper_id):
+        """取出并删除试卷，每份试卷只能交卷一次
+
+        试卷不存在、已交卷或已失效时返回 None。多个请求同时提交同一份试卷时只有一个能删除成功
+        """
+        if not paper_id:
+            return None
+        conn = self.get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT questions, expires_at FROM exam_papers WHERE id = ?', (paper_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        cursor.execute('DELETE FROM exam_papers WHERE id = ?', (paper_id,))
+        conn.commit()
+        if cursor.rowcount != 1 or row[1] <= time.time():
+            return None
+        return [
+            {'question_id': question_id, 'permutation': permutation, 'answer_index': answer_index}
+            for question_id, permutation, answer_index in json.loads(row[0])
+        ]
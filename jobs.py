@@ -0,0 +1,44 @@
+import logging
+import threading
+
+class JobRunner:
+    """进程内后台任务执行器
+
+    任务在后台线程中执行，状态和进度保存在数据库 jobs 表中，任意工作进程都能查询。
+    同类任务同一时间只运行一个（跨工作进程），提交任务的请求立即返回任务ID。
+    """
+    def __init__(self, database, config):
+        self.db = database
+        self.config = config
+        self.logger = logging.getLogger('database.jobs')
+        self._lock = threading.Lock()
+
+    def submit(self, kind, target):
+        """提交任务，返回 (任务ID, 是否新建)
+
+        target(job_id) 在后台线程中执行，返回值作为任务结束时的消息。
+        已有同类任务在运行时不再新建，直接返回正在运行的任务ID。
+        """
+        with self._lock:
+            job_id, created = self.db.create_job(kind, self.config.JOB_STALE_SECONDS)
+        
+        if created:
+            self.logger.info("启动后台任务 %s#%s", kind, job_id)
+            thread = threading.Thread(
+                target=self._run,
+                args=(job_id, kind, target),
+                name=f"job-{kind}-{job_id}",
+                daemon=True
+            )
+            thread.start()
+        return job_id, created
+
+    def _run(self, job_id, kind, target):
+        """执行任务并记录结果"""
+        try:
+            message = target(job_id)
+            self.db.update_job(job_id, finished=True, status='succeeded', message=message)
+            self.logger.info("后台任务 %s#%s 完成: %s", kind, job_id, message)
+        except Exception as e:
+            self.logger.error("后台任务 %s#%s 失败: %s", kind, job_id, e)
+            self.db.update_job(job_id, finished=True, status='failed', message=f"任务失败: {str(e)}")
@@ -0,0 +1,73 @@
+import sys
+import json
+import queue
+import atexit
+import logging
+import os
+from logging.handlers import QueueHandler, QueueListener
+
+# 爬虫日志单独写入 scraper.log，其余写入 LOG_FILE
+SCRAPER_LOGGER = 'scraper'
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class _NameFilter(logging.Filter):
+    """按日志名称前缀筛选，exclude 为 True 时反向筛选"""
+    def __init__(self, prefix, exclude=False):
+        super().__init__()
+        self.prefix = prefix
+        self.exclude = exclude
+
+    def filter(self, record):
+        matched = record.name == self.prefix or record.name.startswith(f'{self.prefix}.')
+        return matched != self.exclude
+
+def setup_logging(config):
+    """配置全局日志，重复调用不会重复添加处理器
+
+    所有日志经根记录器上的 QueueHandler 放入队列，由 QueueListener 的后台线程写入
+    文件和控制台，请求线程不会阻塞在日志 I/O 上。日志调用应使用 %s 占位符延迟格式化，
+    级别未开启时不产生格式化开销。
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    if config.LOG_JSON:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(config.LOG_FORMAT)
+
+    app_file_handler = logging.FileHandler(config.LOG_FILE, encoding='utf-8')
+    app_file_handler.addFilter(_NameFilter(SCRAPER_LOGGER, exclude=True))
+    scraper_file_handler = logging.FileHandler(
+        os.path.join(config.LOG_DIR, 'scraper.log'), encoding='utf-8')
+    scraper_file_handler.addFilter(_NameFilter(SCRAPER_LOGGER))
+    console_handler = logging.StreamHandler(sys.stdout)
+
+    handlers = [app_file_handler, scraper_file_handler, console_handler]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, config.LOG_LEVEL.upper()))
+    root.addHandler(QueueHandler(log_queue))
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # 进程退出时写完队列中剩余的日志
+    atexit.register(_listener.stop)
@@ -1,12 +1,21 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, g, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, make_response
 from scraper import QuestionScraper
 from database import Database
+from sync import QuestionSync
+from jobs import JobRunner
+from answer_token import AnswerTokenSigner
+from page_cache import FragmentCache
+from session_store import create_session_interface
+import metrics
+from log_setup import setup_logging
+import logging
 from quiz import QuizSystem
 from review import ReviewSystem
 from config import config
 from functools import wraps
-import random
+from datetime import datetime
+import time
 
 # 根据环境变量选择配置
 config_instance = config
@@ -17,11 +26,35 @@ config_instance.init_app(app)
 
 app.secret_key = config_instance.SECRET_KEY
 
+setup_logging(config_instance)
+logger = logging.getLogger('app')
+
+if config_instance.METRICS_ENABLED:
+    metrics.init_app(app, config_instance)
+
 db = Database(config_instance)
+app.session_interface = create_session_interface(config_instance, db)
 scraper = QuestionScraper(config_instance)
+question_sync = QuestionSync(scraper, db, config_instance)
+job_runner = JobRunner(db, config_instance)
+answer_signer = AnswerTokenSigner(config_instance.SECRET_KEY)
+
+# 题库列表渲染结果缓存，题库变化时清空
+questions_cache = FragmentCache(config_instance.QUESTIONS_PAGE_CACHE_MB * 1024 * 1024)
+db.on_bank_change(questions_cache.clear)
 quiz_system = QuizSystem(db)
 review_system = ReviewSystem(db)
 
+def current_role():
+    """获取当前登录用户的角色，经数据库用户缓存读取，未登录时返回 None"""
+    if 'user_id' not in session:
+        return None
+    return db.get_user_role(session['user_id'])
+
+@app.context_processor
+def inject_current_role():
+    return {'current_role': current_role()}
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -29,8 +62,7 @@ def admin_required(f):
             flash('请先登录', 'warning')
             return redirect(url_for('login'))
         
-        user_role = db.get_user_role(session['user_id'])
-        if user_role not in ['admin', 'superadmin']:
+        if current_role() not in ['admin', 'superadmin']:
             flash('需要管理员权限', 'danger')
             return redirect(url_for('index'))
         return f(*args, **kwargs)
@@ -43,13 +75,64 @@ def superadmin_required(f):
             flash('请先登录', 'warning')
             return redirect(url_for('login'))
         
-        user_role = db.get_user_role(session['user_id'])
-        if user_role != 'superadmin':
+        if current_role() != 'superadmin':
             flash('需要超级管理员权限', 'danger')
             return redirect(url_for('index'))
         return f(*args, **kwargs)
     return decorated_function
 
+def regenerate_session():
+    """登录状态变化时更换会话ID，防止会话固定攻击；Cookie 会话没有会话ID，无需更换"""
+    regenerate = getattr(session, 'regenerate', None)
+    if regenerate is not None:
+        regenerate()
+
+def guest_wrong_answers():
+    """未登录用户记录在会话中的错题 {题目ID: 错误次数}，兼容旧版同时保存题目内容的记录"""
+    return {
+        question_id: data['count'] if isinstance(data, dict) else data
+        for question_id, data in session.get('wrong_answers', {}).items()
+    }
+
+def record_guest_wrong_answers(question_ids):
+    """在会话中为未登录用户累加错题次数，只保存题目ID和次数"""
+    wrong_answers = guest_wrong_answers()
+    for question_id in question_ids:
+        wrong_answers[str(question_id)] = wrong_answers.get(str(question_id), 0) + 1
+    session['wrong_answers'] = wrong_answers
+
+# 交卷时额外允许的网络延迟（秒）
+EXAM_SUBMIT_GRACE = 30
+# 不限时考试的试卷保留时间（秒）
+EXAM_UNTIMED_LIFETIME = 86400
+
+def render_quiz(question, current_number, **context):
+    """渲染答题页面，为打乱选项后的题目签发答题令牌"""
+    question['token'] = answer_signer.issue(question)
+    return render_template('quiz.html',
+                           question=question,
+                           current_number=current_number,
+                           **context)
+
+def question_payload(question):
+    """打乱选项后的题目数据，供前端直接切换题目，不包含答案"""
+    return {
+        'number': question['number'],
+        'title': question['title'],
+        'options': question['options'],
+        'token': answer_signer.issue(question)
+    }
+
+def prefetch_questions(first_number, count, prefetched_until=0):
+    """从 first_number 开始取 count 道题目的数据，跳过前端已缓存的题号"""
+    payloads = []
+    for number in range(max(first_number, prefetched_until + 1), first_number + count):
+        question = db.get_question_by_number(number)
+        if not question:
+            break
+        payloads.append(question_payload(question))
+    return payloads
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -66,58 +149,27 @@ def quiz():
         else:
             current_number = page_number or session.get('current_number', 1)
         
-        print(f"当前题号: {current_number}")
-        
         # 获取指定题号的题目
         question = db.get_question_by_number(current_number)
-        print(f"获取到的题目: {question}")
+        logger.debug("当前题号: %s, 获取到的题目: %s", current_number, question)
         
         if not question:
             # 检查题库是否为空
             total_questions = db.get_questions_count()
             if total_questions == 0:
-                print("题库为空")  # 调试日志
+                logger.info("题库为空")
                 
                 # 判断用户角色
-                is_admin = session.get('role') in ['admin', 'superadmin']
+                is_admin = current_role() in ['admin', 'superadmin']
                 
                 if is_admin:
-                    print("管理员用户，自动获取题目")  # 调试日志
-                    try:
-                        # 自动调用爬虫获取题目
-                        questions = scraper.get_all_questions()
-                        if questions:
-                            success_count = 0
-                            for q in questions:
-                                try:
-                                    db.add_question(
-                                        q['title'],
-                                        q['options'],
-                                        q['answer'],
-                                        q['number']
-                                    )
-                                    success_count += 1
-                                except Exception as e:
-                                    print(f"保存题目失败: {str(e)}")
-                                    continue
-                            
-                            if success_count > 0:
-                                flash(f'已自动更新 {success_count} 道题目', 'success')
-                                # 重新获取当前题目
-                                question = db.get_question_by_number(current_number)
-                                if question:
-                                    return render_template('quiz.html', 
-                                                         question=question,
-                                                         current_number=current_number)
-                        else:
-                            flash('获取题目失败，请手动更新题库', 'danger')
-                            return redirect(url_for('index'))
-                    except Exception as e:
-                        print(f"自动获取题目失败: {str(e)}")
-                        flash('获取题目失败，请手动更新题库', 'danger')
-                        return redirect(url_for('index'))
+                    logger.info("管理员用户 %s 访问空题库，自动获取题目", session.get('username'))
+                    # 在后台同步题库，跳转到进度页面
+                    job_id, _ = job_runner.submit('sync', question_sync.run_as_job)
+                    flash('题库为空，已在后台开始获取题目', 'info')
+                    return redirect(url_for('update_status', job_id=job_id))
                 else:
-                    print("非管理员用户，提示联系管理员")  # 调试日志
+                    logger.debug("非管理员用户，提示联系管理员")
                     flash('题库暂无题目，请联系管理员维护题目', 'warning')
                     return redirect(url_for('index'))
             
@@ -130,12 +182,10 @@ def quiz():
             flash('题库异常，请联系管理员维护题目', 'warning')
             return redirect(url_for('index'))
         
-        return render_template('quiz.html', 
-                             question=question,
-                             current_number=current_number)
+        return render_quiz(question, current_number)
                              
     except Exception as e:
-        print(f"答题出错: {str(e)}")
+        logger.exception("答题出错: %s", e)
         flash('系统错误，请重试')
         return redirect(url_for('index'))
 
@@ -156,76 +206,72 @@ def practice_wrong():
             return redirect(url_for('review'))
         current_number = question['number']
     else:
-        # 获取所有错题
-        wrong_questions = db.get_wrong_questions(session['user_id'])
-        if not wrong_questions:
+        # 按到期时间选择最早需要复习的错题
+        due_question = db.get_next_due_wrong_question(session['user_id'])
+        if not due_question:
             flash('没有需要练习的错题', 'info')
             return redirect(url_for('review'))
+        if due_question['due_at'] > time.time():
+            due_time = datetime.fromtimestamp(due_question['due_at']).strftime('%Y-%m-%d %H:%M')
+            flash(f'暂无到期的错题，下一道错题将于 {due_time} 到期', 'info')
+            return redirect(url_for('review'))
         
-        # 随机选择一道错题
-        question = db.get_question_by_id(random.choice(wrong_questions)['id'])
+        question = db.get_question_by_id(due_question['id'])
         current_number = question['number']
     
-    return render_template('quiz.html', 
-                         question=question,
-                         current_number=current_number,
-                         is_practice_mode=True)
+    return render_quiz(question, current_number, is_practice_mode=True)
 
 @app.route('/submit_answer', methods=['POST'])
 def submit_answer():
     data = request.get_json()
-    question_id = data.get('question_id')
     answer_index = data.get('answer_index')
     current_number = data.get('current_number', 1)
     is_practice_mode = data.get('is_practice_mode', False)
-    correct_index = data.get('correct_index')
     
-    question = db.get_question_by_id(question_id)
+    # 校验答题令牌，令牌中记录了题目ID和打乱后正确选项的位置
+    answer_token = answer_signer.verify(data.get('token'))
+    if not answer_token:
+        return jsonify({'status': 'error', 'message': '答题令牌无效，请刷新页面'})
+    question_id = answer_token['question_id']
+    
+    question = db.get_question_by_id(question_id, shuffle=False)
     if not question:
         return jsonify({'status': 'error', 'message': '题目不存在'})
     
-    # 使用question中的answer_index进行比较，因为它已经考虑了选项打乱后的顺序
-    is_correct = answer_index == correct_index
+    is_correct = answer_index == answer_token['answer_index']
     
     # 获取下一题的题号
     if is_practice_mode:
-        # 在练习模式下，如果答对了就从错题记录中移除
-        if is_correct and 'user_id' in session:
-            db.remove_wrong_question(session['user_id'], question_id)
-            # 获取剩余错题数量
-            remaining_count = db.get_wrong_questions_count(session['user_id'])
-            if remaining_count == 0:
-                return jsonify({
-                    'status': 'success',
-                    'correct': is_correct,
-                    'answer': question['answer'],
-                    'message': '恭喜！你已完成所有错题练习',
-                    'redirect_url': url_for('index')  # 修改为返回首页
-                })
-        # 获取下一道错题
-        next_question = db.get_next_wrong_question(session['user_id'], current_number)
-        next_number = next_question['number'] if next_question else None
+        if 'user_id' not in session:
+            return jsonify({'status': 'error', 'message': '请先登录后再练习错题'})
         
-        # 如果没有下一题（但还有未答对的题目），返回到第一道错题
-        if next_number is None and db.get_wrong_questions_count(session['user_id']) > 0:
-            first_wrong = db.get_first_wrong_question(session['user_id'])
-            if first_wrong:
-                next_number = first_wrong['number']
+        # 答对后按间隔重复安排下次复习，答错重新计入错题，并取得下一道到期的错题
+        practice = db.answer_practice_question(session['user_id'], question_id, is_correct)
+        if is_correct and practice['remaining'] == 0:
+            return jsonify({
+                'status': 'success',
+                'correct': is_correct,
+                'answer': question['answer'],
+                'message': '恭喜！你已完成所有到期的错题练习',
+                'redirect_url': url_for('index')  # 修改为返回首页
+            })
+        # 没有其他到期的错题时继续练习当前题目
+        next_question = practice['next']
+        if next_question and next_question['due_at'] <= time.time():
+            next_number = next_question['number']
+        else:
+            next_number = current_number
     else:
         next_number = current_number + 1 if current_number else 2
     
-    if not is_correct:
+    # 练习模式下的错题已在 answer_practice_question 中记录
+    if not is_correct and not is_practice_mode:
         if 'user_id' in session:
             # 已登录用户，记录到数据库
             db.record_wrong_answer(session['user_id'], question_id)
         else:
             # 未登录用户，记录到session
-            wrong_answers = session.get('wrong_answers', {})
-            wrong_answers[str(question_id)] = {
-                'count': wrong_answers.get(str(question_id), {}).get('count', 0) + 1,
-                'question': question
-            }
-            session['wrong_answers'] = wrong_answers
+            record_guest_wrong_answers([question_id])
     
     # 更新进度（仅在非练习模式下）
     if not is_practice_mode:
@@ -233,28 +279,100 @@ def submit_answer():
             db.update_user_progress(session['user_id'], next_number)
         session['current_number'] = next_number
     
+    # 附带下一题（普通模式下为之后的若干题）的数据，前端无需重新加载页面
+    if is_practice_mode:
+        next_questions = prefetch_questions(next_number, 1) if next_number else []
+    else:
+        next_questions = prefetch_questions(next_number,
+                                            config_instance.QUIZ_PREFETCH_WINDOW,
+                                            data.get('prefetched_until') or 0)
+    
     return jsonify({
         'status': 'success',
         'correct': is_correct,
         'answer': question['answer'],
         'next_number': next_number,
+        'next_questions': next_questions,
         'auto_next_delay': config_instance.AUTO_NEXT_DELAY
     })
 
+@app.route('/api/question/<int:number>')
+def api_question(number):
+    """获取打乱选项后的题目数据"""
+    question = db.get_question_by_number(number)
+    if not question:
+        return jsonify({'status': 'error', 'message': '题目不存在'}), 404
+    return jsonify({'status': 'success', 'question': question_payload(question)})
+
+@app.route('/exam')
+def exam():
+    """模拟考试：一次抽取整套试卷在同一页面作答"""
+    questions = db.get_questions(config_instance.EXAM_QUESTION_COUNT)
+    if not questions:
+        flash('题库暂无题目，请联系管理员维护题目', 'warning')
+        return redirect(url_for('index'))
+    
+    time_limit = config_instance.EXAM_TIME_LIMIT
+    lifetime = time_limit * 60 + EXAM_SUBMIT_GRACE if time_limit > 0 else EXAM_UNTIMED_LIFETIME
+    return render_template('exam.html',
+                           questions=questions,
+                           paper_id=db.create_exam_paper(questions, lifetime),
+                           time_limit=time_limit)
+
+@app.route('/exam/submit', methods=['POST'])
+def submit_exam():
+    """交卷：一次批改整套试卷，答错的题目在一个事务内记入错题"""
+    paper = db.take_exam_paper(request.form.get('paper_id'))
+    if not paper:
+        flash('试卷无效、已交卷或已超过考试时间，请重新开始考试', 'danger')
+        return redirect(url_for('index'))
+    
+    results = []
+    wrong_question_ids = []
+    for index, item in enumerate(paper):
+        question = db.get_question_by_id(item['question_id'], shuffle=False)
+        if not question:
+            continue
+        
+        answer_index = request.form.get(f'answer_{index}', type=int)
+        if answer_index is not None and not 0 <= answer_index < len(item['permutation']):
+            answer_index = None
+        is_correct = answer_index == item['answer_index']
+        # 未作答的题目计为答错，但不记入错题
+        if answer_index is not None and not is_correct:
+            wrong_question_ids.append(question['id'])
+        
+        results.append({
+            'question': question,
+            'chosen': question['options'][item['permutation'][answer_index]] if answer_index is not None else None,
+            'correct': is_correct
+        })
+    
+    if wrong_question_ids:
+        if 'user_id' in session:
+            db.record_wrong_answers(session['user_id'], {question_id: 1 for question_id in wrong_question_ids})
+        else:
+            record_guest_wrong_answers(wrong_question_ids)
+    
+    return render_template('exam_result.html',
+                           results=results,
+                           score=sum(1 for result in results if result['correct']),
+                           total=len(results))
+
 @app.route('/review')
 def review():
     if 'user_id' in session:
         # 已登录用户，从数据库获取错题
         wrong_questions = db.get_wrong_questions(session['user_id'])
     else:
-        # 未登录用户，从session获取错题
-        wrong_answers = session.get('wrong_answers', {})
-        wrong_questions = [
-            {**data['question'], 'wrong_count': data['count']}
-            for data in wrong_answers.values()
-        ]
+        # 未登录用户，会话中只记录题目ID和次数，题目内容从题库快照获取
+        wrong_questions = []
+        for question_id, count in guest_wrong_answers().items():
+            question = db.get_question_by_id(int(question_id), shuffle=False)
+            if question:
+                wrong_questions.append({**question, 'wrong_count': count})
     
-    return render_template('review.html', wrong_questions=wrong_questions)
+    return render_template('review.html', wrong_questions=wrong_questions, now=datetime.now())
 
 @app.route('/update')
 @admin_required
@@ -263,63 +381,84 @@ def update():
     if config_instance.CONFIRM_UPDATE and not request.args.get('confirmed'):
         return render_template('confirm_update.html')
         
-    try:
-        questions = scraper.get_all_questions()
-        if not questions:
-            flash('未获取到任何题目，请检查网站结构是否变化', 'warning')
-            return redirect(url_for('index'))
-            
-        success_count = 0
-        for question in questions:
-            try:
-                db.add_question(
-                    question['title'],
-                    question['options'],
-                    question['answer'],
-                    question['number']
-                )
-                success_count += 1
-            except Exception as e:
-                print(f"保存题目失败: {str(e)}")
-                continue
-                
-        if success_count > 0:
-            flash(f'成功更新 {success_count} 道题目', 'success')
-        else:
-            flash('未能成功保存任何题目', 'danger')
-            
-    except Exception as e:
-        flash(f'更新失败: {str(e)}', 'danger')
-        print(f"详细错误: {str(e)}")
-        
-    return redirect(url_for('index'))
+    # 在后台同步题库，请求立即返回
+    full = bool(request.args.get('full'))
+    job_id, created = job_runner.submit(
+        'sync', lambda job_id: question_sync.run_as_job(job_id, full=full))
+    if not created:
+        flash('已有题库更新任务正在进行', 'info')
+    
+    return redirect(url_for('update_status', job_id=job_id))
+
+@app.route('/update/<int:job_id>')
+@admin_required
+def update_status(job_id):
+    job = db.get_job(job_id)
+    if not job:
+        flash('更新任务不存在', 'danger')
+        return redirect(url_for('index'))
+    return render_template('update_status.html', job=job)
+
+@app.route('/update/<int:job_id>/progress')
+@admin_required
+def update_progress(job_id):
+    job = db.get_job(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': '更新任务不存在'}), 404
+    return jsonify(job)
 
 @app.route('/questions')
 def view_questions():
     page = request.args.get('page', 1, type=int)
     per_page = app.config['QUESTIONS_PER_PAGE']
     
-    # 获取总题目数和分页数据
-    total_questions = db.get_questions_count()
-    questions = db.get_questions_page(page, per_page)
-    total_pages = (total_questions + per_page - 1) // per_page
-    
     # 传递用户角色信息到模板
-    is_admin = session.get('role') in ['admin', 'superadmin']
+    is_admin = current_role() in ['admin', 'superadmin']
     
-    return render_template('questions.html',
-                         questions=questions,
-                         current_page=page,
-                         total_pages=total_pages,
-                         is_admin=is_admin,
-                         max=max,
-                         min=min)
+    # 题目列表对同一角色的所有用户相同，按题库版本缓存渲染结果
+    cache_key = (page, per_page, 'admin' if is_admin else 'user', db.get_question_snapshot().version)
+    questions_html = questions_cache.get(cache_key)
+    if questions_html is None:
+        # 获取总题目数和分页数据
+        total_questions = db.get_questions_count()
+        questions = db.get_questions_page(page, per_page)
+        total_pages = (total_questions + per_page - 1) // per_page
+        
+        questions_html = render_template('questions_list.html',
+                                         questions=questions,
+                                         current_page=page,
+                                         total_pages=total_pages,
+                                         is_admin=is_admin,
+                                         max=max,
+                                         min=min)
+        questions_cache.set(cache_key, questions_html)
+    
+    response = make_response(render_template('questions.html',
+                                             questions_html=questions_html,
+                                             is_admin=is_admin))
+    # 页面包含用户信息，只允许浏览器缓存，每次使用前通过 ETag 校验
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/api/questions')
+def api_questions():
+    """题库的 JSON 接口，按题号键集分页，用于无限滚动加载"""
+    after = request.args.get('after', type=int)
+    per_page = app.config['QUESTIONS_PER_PAGE']
+    limit = min(max(request.args.get('limit', per_page, type=int), 1), per_page)
+    
+    questions = db.get_questions_after(after, limit)
+    return jsonify({
+        'questions': questions,
+        'total': db.get_questions_count(),
+        'next_after': questions[-1]['number'] if len(questions) == limit else None
+    })
 
 @app.teardown_appcontext
-def close_db(error):
-    """关闭数据库连接"""
-    if hasattr(g, 'sqlite_db'):
-        g.sqlite_db.close()
+def release_db(error):
+    """释放数据库连接，连接本身在线程内复用"""
+    db.release_db()
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -331,15 +470,13 @@ def login():
                 flash('用户名不可用', 'danger')
                 return redirect(url_for('login'))
                 
+            regenerate_session()
             session['user_id'] = user['id']
             session['username'] = user['username']
-            session['role'] = user['role']
             
             # 如果有临时的错题记录，转移到数据库
             if 'wrong_answers' in session:
-                for question_id, data in session['wrong_answers'].items():
-                    for _ in range(data['count']):
-                        db.record_wrong_answer(user['id'], int(question_id))
+                db.record_wrong_answers(user['id'], guest_wrong_answers())
                 session.pop('wrong_answers')  # 清除临时记录
             
             # 如果有临时进度记录，更新到数据库
@@ -358,6 +495,7 @@ def logout():
     
     # 清除登录信息
     session.clear()
+    regenerate_session()
     
     # 恢复错题记录
     if wrong_answers:
@@ -0,0 +1,143 @@
+import sys
+import time
+import logging
+import sqlite3
+import threading
+from flask import g, request, Response
+
+# 请求耗时和 SQL 耗时的直方图分桶（秒）
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+class Histogram:
+    """带标签的直方图，按 Prometheus 文本格式输出"""
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # {标签值元组: [各分桶计数..., 总和, 总数]}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        """记录一次观测值"""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        """输出 Prometheus 文本格式"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            label_text = ','.join(
+                f'{name}="{_escape_label(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = f'{label_text},' if label_text else ''
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {values[-1]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {values[-2]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {values[-1]}')
+        return '\n'.join(lines)
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsRegistry:
+    """进程内的指标汇总
+
+    多进程部署时每个工作进程各自统计，/metrics 返回处理该请求的进程的数据。
+    """
+    def __init__(self):
+        self.request_duration = Histogram(
+            'app_request_duration_seconds', '请求处理耗时',
+            ('endpoint', 'method', 'status'), REQUEST_BUCKETS)
+        self.sql_duration = Histogram(
+            'app_sql_duration_seconds', 'SQL 语句执行耗时（不含逐行读取结果），按调用方法分组',
+            ('caller',), SQL_BUCKETS)
+        self.slow_query_seconds = 0
+        self.logger = logging.getLogger('database.slow_query')
+
+    def observe_sql(self, caller, sql, seconds):
+        """记录一条 SQL 的耗时，超过慢查询阈值时写日志"""
+        self.sql_duration.observe((caller,), seconds)
+        if self.slow_query_seconds and seconds >= self.slow_query_seconds:
+            self.logger.warning("慢查询 %.1fms %s: %s", seconds * 1000, caller, ' '.join(sql.split()))
+
+    def render(self):
+        return '\n'.join([self.request_duration.render(), self.sql_duration.render()]) + '\n'
+
+registry = MetricsRegistry()
+
+# 推导式和生成器表达式有自己的栈帧，归到定义它们的函数
+_COMPREHENSION_NAMES = {'<listcomp>', '<dictcomp>', '<setcomp>', '<genexpr>'}
+
+def _caller():
+    """发起 SQL 的函数，格式为 模块名.函数名"""
+    frame = sys._getframe(2)
+    while frame.f_code.co_filename == __file__ or frame.f_code.co_name in _COMPREHENSION_NAMES:
+        frame = frame.f_back
+    return f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}"
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """统计每条语句耗时的游标"""
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            registry.observe_sql(_caller(), sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            registry.observe_sql(_caller(), sql, time.perf_counter() - start)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """通过 sqlite3.connect(factory=...) 使用，所有语句都经过 InstrumentedCursor"""
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def init_app(app, config):
+    """注册请求计时钩子和 /metrics 接口"""
+    registry.slow_query_seconds = config.METRICS_SLOW_QUERY_MS / 1000
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started_at = time.perf_counter()
+
+    @app.after_request
+    def remember_response_status(response):
+        g.response_status = response.status_code
+        return response
+
+    # 在 teardown_request 中记录耗时，视图抛出未处理的异常时也会执行；
+    # 没有经过 after_request 的请求按 500 记录
+    @app.teardown_request
+    def record_request_duration(exc):
+        started_at = g.pop('request_started_at', None)
+        if started_at is None:
+            return
+        status = g.pop('response_status', 500)
+        registry.request_duration.observe(
+            (request.endpoint or 'unknown', request.method, status),
+            time.perf_counter() - started_at)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
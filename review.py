@@ -1,3 +1,5 @@
+from database import decode_options
+
 class ReviewSystem:
     def __init__(self, database):
         self.db = database
@@ -15,7 +17,7 @@ class ReviewSystem:
             print(f"\n错题 {i} (错误次数: {question[4]}):")
             print(question[1])  # 题目
             
-            options = eval(question[2])  # 将字符串转换回列表
+            options = decode_options(question[2])  # 将字符串转换回列表
             for j, option in enumerate(options, 1):
                 print(f"{j}. {option}")
             
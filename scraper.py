@@ -1,11 +1,43 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
 import time
 import re
-import os
-import json
 import logging
-from datetime import datetime, timedelta
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from cache import create_page_cache
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_PARSER = 'html.parser'
+
+# 题目卡片的匹配条件。解析时的 SoupStrainer 把 class 当作整个属性字符串比较，
+# class="card mb-3" 不会匹配 'card'，因此只按 data-num 筛选，解析后再按 class 过滤
+CARD_ATTRS = {'data-num': True}
+CARD_CLASS = 'card'
+
+class RateLimiter:
+    """全局请求限速器，保证相邻两次网络请求的开始时间间隔不小于 interval 秒"""
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_time = 0
+
+    def wait(self):
+        """等待直到允许发出下一次请求"""
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
 
 class QuestionScraper:
     def __init__(self, config):
@@ -15,112 +47,128 @@ class QuestionScraper:
         self.question_type = config.SCRAPER_QUESTION_TYPE
         self.total_questions = None
         self.questions_per_page = None
+        self.rate_limiter = RateLimiter(config.SCRAPER_DELAY)
+        self.session = self._create_session()
+        self.parser = DEFAULT_PARSER if config.SCRAPER_PARSER == 'auto' else config.SCRAPER_PARSER
+        self.parse_only = SoupStrainer('div', attrs=CARD_ATTRS) if config.SCRAPER_PARSE_ONLY_CARDS else None
         
-        # 配置日志
-        self.logger = logging.getLogger('scraper')
-        self.logger.setLevel(getattr(logging, config.LOG_LEVEL.upper()))
-        
-        # 创建日志处理器
-        log_file = os.path.join(config.LOG_DIR, 'scraper.log')
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        console_handler = logging.StreamHandler()
-        
-        # 设置日志格式
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
+        # 页面缓存，后端由 cache.backend 配置决定
+        self.cache = create_page_cache(config, self.question_type) if config.USE_CACHE else None
         
-        # 添加处理器
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        # 日志处理器由 log_setup.setup_logging 统一配置，写入 scraper.log
+        self.logger = logging.getLogger('scraper')
+
+    def _create_session(self):
+        """创建带连接池和重试策略的 HTTP 会话"""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        retry = Retry(
+            total=self.config.SCRAPER_RETRIES,
+            backoff_factor=self.config.SCRAPER_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET'])
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.config.SCRAPER_POOL_SIZE,
+            max_retries=retry
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _get_conditional_headers(self, page):
+        """根据缓存记录生成条件请求头"""
+        if not self.cache or not self.cache.has_page(page):
+            return {}
+
+        page_entry = self.cache.get_entry(page)
+        headers = {}
+        if page_entry.get('etag'):
+            headers['If-None-Match'] = page_entry['etag']
+        if page_entry.get('last_modified'):
+            headers['If-Modified-Since'] = page_entry['last_modified']
+        return headers
 
-    def _get_cache_path(self, page):
-        """获取缓存文件路径"""
-        cache_key = f"type_{self.question_type}_page_{page}"
-        return os.path.join(self.config.CACHE_DIR, f"{cache_key}.json")
+    def _get_validators(self, response):
+        """从响应头中提取 ETag/Last-Modified"""
+        validators = {}
+        for header, key in (('ETag', 'etag'), ('Last-Modified', 'last_modified')):
+            if response.headers.get(header):
+                validators[key] = response.headers[header]
+        return validators
 
     def _get_cache_info(self):
-        """从缓存目录获取题目总数信息"""
-        if not self.config.USE_CACHE or not os.path.exists(self.config.CACHE_DIR):
+        """从缓存获取题目总数信息"""
+        if not self.cache:
             return None, None
 
         try:
-            # 获取所有缓存文件
-            cache_files = [f for f in os.listdir(self.config.CACHE_DIR) 
-                         if f.startswith(f"type_{self.question_type}_page_") and f.endswith('.json')]
-            
-            if not cache_files:
-                return None, None
-
-            # 获取最大题目编号和每页题目数
-            max_number = 0
-            questions_per_page = 0
-            
-            for cache_file in cache_files:
-                file_path = os.path.join(self.config.CACHE_DIR, cache_file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        questions = json.load(f)
-                        if questions and len(questions) > 0:
-                            questions_per_page = max(questions_per_page, len(questions))
-                            for q in questions:
-                                if 'number' in q:
-                                    max_number = max(max_number, q['number'])
-                except Exception as e:
-                    self.logger.error(f"读取缓存文件 {cache_file} 失败: {str(e)}")
-                    continue
-
+            max_number, questions_per_page = self.cache.get_info()
             if max_number > 0 and questions_per_page > 0:
-                total_questions = max_number
-                self.logger.info(f"从缓存目录获取信息：最大题号={max_number}, 每页题数={questions_per_page}")
-                return total_questions, questions_per_page
-
+                self.logger.info("从缓存获取信息：最大题号=%s, 每页题数=%s", max_number, questions_per_page)
+                return max_number, questions_per_page
         except Exception as e:
-            self.logger.error(f"获取缓存信息失败: {str(e)}")
+            self.logger.error("获取缓存信息失败: %s", e)
         
         return None, None
 
-    def _load_cache(self, page):
-        """从缓存加载数据"""
-        if not self.config.USE_CACHE:
-            return None
-
-        cache_path = self._get_cache_path(page)
-        if not os.path.exists(cache_path):
-            return None
+    def _parse_cards(self, html):
+        """解析页面并一次性提取所有题目卡片"""
+        soup = BeautifulSoup(html, self.parser, parse_only=self.parse_only)
+        return soup.find_all('div', class_=CARD_CLASS, attrs=CARD_ATTRS)
 
-        # 检查缓存是否过期
-        if self.config.CACHE_EXPIRE_DAYS > 0:  # 只有当过期天数大于0时才检查
-            file_time = datetime.fromtimestamp(os.path.getmtime(cache_path))
-            expire_time = datetime.now() - timedelta(days=self.config.CACHE_EXPIRE_DAYS)
-            if file_time < expire_time:
-                return None
-
-        try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            self.logger.error(f"读取缓存失败: {str(e)}")
-            return None
-
-    def _save_cache(self, page, data):
-        """保存数据到缓存"""
-        if not self.config.USE_CACHE:
-            return
+    def _extract_questions(self, cards):
+        """从题目卡片中提取题号、题干、选项和答案，无法解析的卡片跳过"""
+        questions = []
+        
+        for card in cards:
+            try:
+                question_number = card.find('span', class_='text-success').get_text(strip=True)
+                question_number = int(re.search(r'(\d+)/\d+', question_number).group(1))
+                
+                title = card.find('div', class_='card-body').find('p', class_='card-text').get_text(strip=True)
+                title = re.sub(r'^\d+/\d+\s*', '', title)
+                
+                options = []
+                answer = None
+                options_div = card.find('div', class_='list-group')
+                
+                for option_item in options_div.find_all('div', class_='list-group-item'):
+                    option_text = option_item.find('label').get_text(strip=True)
+                    option_text = re.sub(r'^[A-D]\s*', '', option_text)
+                    options.append(option_text)
+                    
+                    if 'bg-success' in option_item.get('class', []):
+                        answer = option_text
+                
+                if title and options and answer:
+                    questions.append({
+                        'number': question_number,
+                        'title': title,
+                        'options': options,
+                        'answer': answer
+                    })
+                    self.logger.debug("成功解析题目 %s", question_number)
+            
+            except Exception as e:
+                self.logger.error("解析题目时出错: %s", e)
+                continue
+        
+        return questions
 
-        cache_path = self._get_cache_path(page)
-        try:
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            self.logger.error(f"保存缓存失败: {str(e)}")
+    def _get_total_info(self, cards, force=False):
+        """从页面的题目卡片获取题目总数和每页题目数
 
-    def _get_total_info(self, soup):
-        """从页面获取题目总数和每页题目数"""
+        force 为 True 时忽略已有的值，以该页为准重新获取
+        """
+        if force:
+            self.total_questions = None
+            self.questions_per_page = None
         if self.total_questions is None or self.questions_per_page is None:
             try:
                 # 获取第一个题目的编号信息
-                first_question = soup.find('span', class_='text-success')
+                first_question = cards[0].find('span', class_='text-success') if cards else None
                 if first_question:
                     text = first_question.get_text(strip=True)
                     total_match = re.search(r'\d+/(\d+)', text)
@@ -128,29 +176,36 @@ class QuestionScraper:
                         self.total_questions = int(total_match.group(1))
                 
                 # 计算每页题目数
-                cards = soup.find_all('div', class_='card', attrs={'data-num': True})
                 self.questions_per_page = len(cards)
                 
-                self.logger.info(f"从页面获取信息：总题数={self.total_questions}, 每页题数={self.questions_per_page}")
+                self.logger.info("从页面获取信息：总题数=%s, 每页题数=%s", self.total_questions, self.questions_per_page)
             except Exception as e:
-                self.logger.error(f"获取题目信息时出错: {str(e)}")
+                self.logger.error("获取题目信息时出错: %s", e)
                 # 设置默认值
                 self.total_questions = 0
                 self.questions_per_page = 10
 
-    def get_questions(self, page=1):
-        """获取指定页面的题目"""
+    def get_questions(self, page=1, refresh=False):
+        """获取指定页面的题目
+
+        refresh 为 True 时跳过缓存有效期判断，向服务器发送条件请求，
+        页面未变化（304）时直接返回缓存内容。
+        refresh 为 True 时第一页总是完整请求，题目总数和每页题目数以网站当前的第一页为准，
+        不使用缓存清单中的记录
+        """
+        live_total = refresh and page == 1
+        
         # 如果还没有题目信息，尝试从缓存目录获取
-        if (self.total_questions is None or self.questions_per_page is None) and self.config.USE_CACHE:
+        if not live_total and (self.total_questions is None or self.questions_per_page is None):
             total_questions, questions_per_page = self._get_cache_info()
             if total_questions and questions_per_page:
                 self.total_questions = total_questions
                 self.questions_per_page = questions_per_page
 
         # 尝试从缓存加载
-        cached_data = self._load_cache(page)
+        cached_data = self.cache.load(page) if self.cache and not refresh else None
         if cached_data:
-            self.logger.info(f"从缓存加载第{page}页的题目")
+            self.logger.info("从缓存加载第%s页的题目", page)
             return cached_data
 
         params = {
@@ -158,108 +213,110 @@ class QuestionScraper:
             'page': page
         }
         try:
-            self.logger.info(f"开始爬取第{page}页题目")
-            response = requests.get(
+            self.rate_limiter.wait()
+            self.logger.info("开始爬取第%s页题目", page)
+            response = self.session.get(
                 self.base_url, 
                 params=params, 
-                headers=self.headers, 
+                headers={} if live_total else self._get_conditional_headers(page), 
                 timeout=self.config.SCRAPER_REQUEST_TIMEOUT
             )
+            
+            # 页面未变化，沿用缓存内容
+            if response.status_code == 304:
+                cached_data = self.cache.load(page, check_expire=False) if self.cache else None
+                if cached_data:
+                    self.logger.info("第%s页未变化，使用缓存", page)
+                    self.cache.touch(page, self._get_validators(response))
+                    return cached_data
+                
+                # 缓存文件已丢失，重新完整获取
+                self.rate_limiter.wait()
+                response = self.session.get(
+                    self.base_url, 
+                    params=params, 
+                    timeout=self.config.SCRAPER_REQUEST_TIMEOUT
+                )
+            
             response.raise_for_status()
             response.encoding = 'utf-8'
-            soup = BeautifulSoup(response.text, 'html.parser')
+            cards = self._parse_cards(response.text)
             
             # 获取题目总数和每页题目数
-            self._get_total_info(soup)
+            self._get_total_info(cards, force=live_total)
             
-            questions = []
-            cards = soup.find_all('div', class_='card', attrs={'data-num': True})
-            
-            for card in cards:
-                try:
-                    question_number = card.find('span', class_='text-success').get_text(strip=True)
-                    question_number = int(re.search(r'(\d+)/\d+', question_number).group(1))
-                    
-                    title = card.find('div', class_='card-body').find('p', class_='card-text').get_text(strip=True)
-                    title = re.sub(r'^\d+/\d+\s*', '', title)
-                    
-                    options = []
-                    answer = None
-                    options_div = card.find('div', class_='list-group')
-                    
-                    for option_item in options_div.find_all('div', class_='list-group-item'):
-                        option_text = option_item.find('label').get_text(strip=True)
-                        option_text = re.sub(r'^[A-D]\s*', '', option_text)
-                        options.append(option_text)
-                        
-                        if 'bg-success' in option_item.get('class', []):
-                            answer = option_text
-                    
-                    if title and options and answer:
-                        questions.append({
-                            'number': question_number,
-                            'title': title,
-                            'options': options,
-                            'answer': answer
-                        })
-                        self.logger.debug(f"成功解析题目 {question_number}")
-                
-                except Exception as e:
-                    self.logger.error(f"解析题目时出错: {str(e)}")
-                    continue
+            questions = self._extract_questions(cards)
             
-            self.logger.info(f"成功获取第{page}页的 {len(questions)} 道题目")
+            self.logger.info("成功获取第%s页的 %s 道题目", page, len(questions))
             
             # 保存到缓存
-            if questions:
-                self._save_cache(page, questions)
+            if questions and self.cache:
+                self.cache.save(page, questions, self._get_validators(response))
                 
             return questions
             
         except requests.RequestException as e:
-            self.logger.error(f"请求失败: {str(e)}")
+            self.logger.error("请求失败: %s", e)
             return []
         except Exception as e:
-            self.logger.error(f"爬取失败: {str(e)}")
+            self.logger.error("爬取失败: %s", e)
             return []
-        finally:
-            time.sleep(self.config.SCRAPER_DELAY)
+
+    def iter_pages(self, pages, refresh=False):
+        """由线程池并发获取页面，按页码顺序逐页返回 (页码, 题目)
+
+        同时提交的页面不超过 SCRAPER_WORKERS 个，前一页交给调用方时才提交下一页。
+        调用方提前停止迭代时取消尚未开始的请求，多获取的页面不超过线程数。
+        """
+        pages = iter(pages)
+        with ThreadPoolExecutor(max_workers=self.config.SCRAPER_WORKERS) as executor:
+            futures = deque(
+                (page, executor.submit(self.get_questions, page, refresh))
+                for page in islice(pages, self.config.SCRAPER_WORKERS))
+            try:
+                while futures:
+                    page, future = futures.popleft()
+                    questions = future.result()
+                    next_page = next(pages, None)
+                    if next_page is not None:
+                        futures.append((next_page, executor.submit(self.get_questions, next_page, refresh)))
+                    yield page, questions
+            finally:
+                for _, future in futures:
+                    future.cancel()
 
     def get_all_questions(self):
         """获取所有题目"""
         self.logger.info("开始获取所有题目")
         all_questions = []
-        page = 1
         
         # 先获取第一页来确定总页数
-        questions = self.get_questions(page)
+        questions = self.get_questions(1)
         if not questions:
             self.logger.error("获取第一页失败，终止爬取")
             return []
             
         all_questions.extend(questions)
-        page += 1
         
         # 计算总页数
         if self.total_questions and self.questions_per_page:
             total_pages = (self.total_questions + self.questions_per_page - 1) // self.questions_per_page
-            self.logger.info(f"总页数：{total_pages}")
+            self.logger.info("总页数：%s", total_pages)
             
-            while page <= total_pages:
-                questions = self.get_questions(page)
+            # 其余页面并发获取，结果按页码顺序合并
+            for page, questions in self.iter_pages(range(2, total_pages + 1)):
                 if not questions:
-                    self.logger.warning(f"获取第{page}页失败，提前终止爬取")
+                    self.logger.warning("获取第%s页失败，提前终止爬取", page)
                     break
                 all_questions.extend(questions)
-                page += 1
         
-        self.logger.info(f"爬取完成，总共获取 {len(all_questions)} 道题目")
+        self.logger.info("爬取完成，总共获取 %s 道题目", len(all_questions))
         return all_questions
 
     def debug_html(self, html_content):
         """用于调试的方法，打印HTML结构"""
         self.logger.debug("HTML内容预览:")
         self.logger.debug(html_content[:1000])  # 打印前1000个字符
-        soup = BeautifulSoup(html_content, 'html.parser')
+        soup = BeautifulSoup(html_content, self.parser)
         self.logger.debug("\n页面结构:")
         self.logger.debug(soup.prettify()[:1000])  # 打印格式化后的前1000个字符 
\ No newline at end of file
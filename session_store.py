@@ -0,0 +1,134 @@
+import time
+import secrets
+import logging
+import threading
+from flask.sessions import SessionInterface, SessionMixin, SecureCookieSessionInterface
+from flask.json.tag import TaggedJSONSerializer
+from werkzeug.datastructures import CallbackDict
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """保存在服务端的会话，Cookie 中只有会话ID"""
+    def __init__(self, initial=None, sid=None, new=False, expires_at=0):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.previous_sid = None
+        self.modified = False
+
+    def regenerate(self):
+        """更换会话ID并保留会话数据，登录和退出时调用以防止会话固定攻击
+
+        旧的会话记录在保存会话时删除
+        """
+        if not self.new and self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+class SQLiteSessionInterface(SessionInterface):
+    """SQLite 会话存储
+
+    会话数据以 JSON 保存在数据库的 sessions 表中，Cookie 只携带随机生成的会话ID，
+    无论会话中记录了多少数据，请求头的大小都保持不变。
+    会话在 lifetime 秒内无访问即过期，过期记录每隔 sweep_interval 秒清理一次。
+    """
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, database, lifetime, sweep_interval):
+        self.database = database
+        self.lifetime = lifetime
+        self.sweep_interval = sweep_interval
+        self.logger = logging.getLogger('session')
+        self._last_sweep = 0
+        self._sweep_lock = threading.Lock()
+
+        conn = database.get_db()
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL  -- Unix 时间戳
+        )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)')
+        conn.commit()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = self.database.get_db().execute(
+                'SELECT data, expires_at FROM sessions WHERE id = ?', (sid,)).fetchone()
+            if row and row[1] > time.time():
+                try:
+                    return ServerSideSession(self.serializer.loads(row[0]), sid=sid, expires_at=row[1])
+                except Exception as e:
+                    self.logger.error("读取会话失败: %s", e)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        conn = self.database.get_db()
+        now = time.time()
+
+        # 会话ID已更换，旧ID立即失效
+        if session.previous_sid:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (session.previous_sid,))
+            conn.commit()
+
+        # 会话被清空时删除记录和 Cookie
+        if not session:
+            if session.modified and not session.new:
+                conn.execute('DELETE FROM sessions WHERE id = ?', (session.sid,))
+                conn.commit()
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # 数据未变化且离过期还早时不必写库，只在过半有效期后顺延
+        refresh = session.expires_at - now < self.lifetime / 2
+        if session.modified or refresh:
+            conn.execute('''
+                INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at
+            ''', (session.sid, self.serializer.dumps(dict(session)), now + self.lifetime))
+            conn.commit()
+
+        if session.new or session.previous_sid or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+
+        self._sweep(conn, now)
+
+    def _sweep(self, conn, now):
+        """每隔 sweep_interval 秒清理一次过期会话"""
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        with self._sweep_lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+        cursor = conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+        conn.commit()
+        if cursor.rowcount:
+            self.logger.info("已清理过期会话 %s 个", cursor.rowcount)
+
+def create_session_interface(config, database):
+    """根据配置创建会话存储"""
+    if config.SESSION_BACKEND == 'cookie':
+        return SecureCookieSessionInterface()
+    if config.SESSION_BACKEND == 'sqlite':
+        return SQLiteSessionInterface(database, config.SESSION_LIFETIME_DAYS * 86400,
+                                      config.SESSION_SWEEP_INTERVAL)
+    raise ValueError(f"未知的会话存储类型: {config.SESSION_BACKEND}")
@@ -0,0 +1,185 @@
+import logging
+
+from database import question_hash
+
+class QuestionSync:
+    """题库增量同步
+
+    并发获取页面并按页码顺序与数据库中的内容哈希比较，只写入新增和变化的题目，
+    题目按题号原地更新，ID 保持不变。题目总数未变时，连续若干页没有变化即提前停止。
+    """
+    def __init__(self, scraper, database, config):
+        self.scraper = scraper
+        self.db = database
+        self.config = config
+        self.logger = logging.getLogger('scraper.sync')
+
+    def run(self, full=False, progress=None):
+        """执行一次同步，返回变化报告
+
+        先完整请求第一页，得到网站当前的题目总数，再与数据库中的题目数和最大题号比较：
+        总数未变时连续 SYNC_STOP_AFTER_UNCHANGED 页没有变化即提前停止；只在末尾新增了题目时，
+        已有题目的页面仍可提前停止，已存最大题号之后的页面总是获取；其他情况完整遍历所有页面。
+        full 为 True 时不提前停止。完整遍历所有页面且每页题目都解析完整时，
+        删除题号超出网站题目总数的题目。
+        progress 为可选回调，每处理完一页调用 progress(report, total_pages)。
+        报告中 added/changed/removed 为题号列表，complete 表示是否遍历了所有页面。
+        """
+        report = {
+            'added': [],
+            'changed': [],
+            'removed': [],
+            'unchanged': 0,
+            'pages_fetched': 0,
+            'errors': 0,
+            'complete': False
+        }
+        stored_hashes = self.db.get_question_hashes()
+        seen_numbers = set()
+        pending = []
+        
+        def check_page(questions):
+            """与数据库中的内容哈希比较，记录新增和变化的题目，返回该页是否有变化"""
+            page_changed = False
+            for question in questions:
+                number = question['number']
+                seen_numbers.add(number)
+                stored = stored_hashes.get(number)
+                if stored == question_hash(question['title'], question['options'], question['answer']):
+                    report['unchanged'] += 1
+                    continue
+                
+                report['added' if stored is None else 'changed'].append(number)
+                pending.append(question)
+                page_changed = True
+            return page_changed
+        
+        # 第一页总是请求网站，从中获取当前的题目总数
+        questions = self.scraper.get_questions(1, refresh=True)
+        if not questions:
+            self.logger.warning("获取第1页失败，终止同步")
+            report['errors'] += 1
+        else:
+            total = self.scraper.total_questions
+            per_page = self.scraper.questions_per_page
+            incomplete = False
+            
+            def check_count(page, questions):
+                """页面中解析出的题目少于应有数量（有卡片无法解析）时记为错误，返回是否完整"""
+                expected = min(per_page, total - (page - 1) * per_page)
+                if len(questions) >= expected:
+                    return True
+                self.logger.warning("第%s页只解析出 %s 道题目，应有 %s 道", page, len(questions), expected)
+                report['errors'] += 1
+                return False
+            
+            report['pages_fetched'] += 1
+            unchanged_pages = 0 if check_page(questions) else 1
+            
+            total_pages = 1
+            segments = []
+            if total and per_page:
+                incomplete = not check_count(1, questions)
+                total_pages = -(-total // per_page)
+                stop_after = 0 if full else self.config.SYNC_STOP_AFTER_UNCHANGED
+                segments = self._plan_pages(stored_hashes, total_pages, stop_after)
+            else:
+                # 不知道总页数，无法判断其他页面的题目是否还存在
+                self.logger.warning("第1页没有题目总数，只检查第1页")
+                incomplete = True
+            if progress:
+                progress(report, total_pages)
+            
+            failed = stopped = False
+            for pages, stop_after in segments:
+                for page, questions in self.scraper.iter_pages(pages, refresh=True):
+                    if not questions:
+                        self.logger.warning("获取第%s页失败，终止同步", page)
+                        report['errors'] += 1
+                        failed = True
+                        break
+                    report['pages_fetched'] += 1
+                    if not check_count(page, questions):
+                        incomplete = True
+                    unchanged_pages = 0 if check_page(questions) else unchanged_pages + 1
+                    if progress:
+                        progress(report, total_pages)
+                    
+                    if stop_after and unchanged_pages >= stop_after and page < pages[-1]:
+                        self.logger.info("连续 %s 页没有变化，在第%s页停止检查", unchanged_pages, page)
+                        stopped = True
+                        break
+                if failed:
+                    break
+            report['complete'] = not (failed or stopped or incomplete)
+        
+        if pending:
+            self.db.bulk_upsert_questions(pending)
+        
+        # 只有完整遍历所有页面时才能确定哪些题目已被删除，且只删除题号超出网站题目总数的题目；
+        # 总数以内却没有出现的题目可能只是暂时无法解析，保留题目和错题记录
+        if report['complete']:
+            missing = set(stored_hashes) - seen_numbers
+            report['removed'] = sorted(number for number in missing if number > total)
+            kept = missing.difference(report['removed'])
+            if kept:
+                self.logger.warning("题号 %s 在网站题目总数以内但未获取到，未删除", sorted(kept))
+            self.db.delete_questions(report['removed'])
+        
+        self.logger.info(
+            "同步完成: 请求 %s 页, 新增 %s, 更新 %s, 删除 %s, 未变化 %s",
+            report['pages_fetched'], len(report['added']), len(report['changed']),
+            len(report['removed']), report['unchanged'])
+        return report
+
+    def _plan_pages(self, stored_hashes, total_pages, stop_after):
+        """确定第一页之后需要检查的页面
+
+        返回 [(页码范围, 提前停止所需的连续无变化页数)]，0 表示该范围内的页面全部获取
+        """
+        total = self.scraper.total_questions
+        per_page = self.scraper.questions_per_page
+        stored_count = len(stored_hashes)
+        stored_max = max(stored_hashes, default=0)
+        
+        if not stop_after:
+            return [(range(2, total_pages + 1), 0)]
+        
+        # 题目总数未变，按连续无变化的页数提前停止
+        if total == stored_count == stored_max:
+            return [(range(2, total_pages + 1), stop_after)]
+        
+        # 只在末尾新增了题目：已存题目所在的页面可以提前停止，之后的页面全部获取
+        if total > stored_max and stored_count == stored_max:
+            first_new_page = stored_max // per_page + 1
+            self.logger.info("题目总数由 %s 增加到 %s，从第%s页起全部获取", stored_count, total, first_new_page)
+            return [(range(2, first_new_page), stop_after),
+                    (range(max(2, first_new_page), total_pages + 1), 0)]
+        
+        # 题目减少或题号不连续，完整遍历以找出删除的题目
+        self.logger.info("题目总数 %s 与已存题目数 %s 不一致，完整同步", total, stored_count)
+        return [(range(2, total_pages + 1), 0)]
+
+    def run_as_job(self, job_id, full=False):
+        """作为后台任务执行同步，进度写入任务记录"""
+        def progress(report, total_pages):
+            self.db.update_job(
+                job_id,
+                pages_done=report['pages_fetched'],
+                pages_total=total_pages,
+                errors=report['errors'],
+                message=f"发现 {len(report['added']) + len(report['changed'])} 道新增或变化的题目"
+            )
+        
+        report = self.run(full=full, progress=progress)
+        if not report['pages_fetched']:
+            raise RuntimeError('未获取到任何题目，请检查网站结构是否变化')
+        
+        self.db.update_job(
+            job_id,
+            questions_saved=len(report['added']) + len(report['changed']),
+            errors=report['errors']
+        )
+        return (f"新增 {len(report['added'])} 道，更新 {len(report['changed'])} 道，"
+                f"删除 {len(report['removed'])} 道，检查了 {report['pages_fetched']} 页")
+
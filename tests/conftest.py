@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import Database
+
+@pytest.fixture
+def db(tmp_path):
+    """使用临时数据库文件的 Database，关闭指标统计和写后缓冲"""
+    config = Config()
+    config.DATABASE_FILE = str(tmp_path / 'questions.db')
+    config.METRICS_ENABLED = False
+    config.DATABASE_WRITE_BEHIND_MS = 0
+    return Database(config)
@@ -0,0 +1,49 @@
+import os
+import importlib.util
+
+import pytest
+from bs4 import SoupStrainer
+
+from config import Config
+from scraper import CARD_ATTRS, QuestionScraper
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'questions_page.html')
+
+LXML_INSTALLED = importlib.util.find_spec('lxml') is not None
+PARSERS = ['html.parser', pytest.param('lxml', marks=pytest.mark.skipif(not LXML_INSTALLED, reason='未安装 lxml'))]
+
+@pytest.fixture(scope='module')
+def html():
+    with open(FIXTURE, encoding='utf-8') as f:
+        return f.read()
+
+@pytest.fixture(scope='module')
+def scraper():
+    config = Config()
+    config.USE_CACHE = False
+    return QuestionScraper(config)
+
+def extract(scraper, html, parser, parse_only_cards):
+    scraper.parser = parser
+    scraper.parse_only = SoupStrainer('div', attrs=CARD_ATTRS) if parse_only_cards else None
+    scraper.total_questions = scraper.questions_per_page = None
+    cards = scraper._parse_cards(html)
+    scraper._get_total_info(cards)
+    return scraper._extract_questions(cards), scraper.total_questions, scraper.questions_per_page
+
+@pytest.mark.parametrize('parse_only_cards', [False, True])
+@pytest.mark.parametrize('parser', PARSERS)
+def test_all_parsers_extract_same_questions(scraper, html, parser, parse_only_cards):
+    expected = extract(scraper, html, 'html.parser', False)
+    assert extract(scraper, html, parser, parse_only_cards) == expected
+
+def test_fixture_cards_with_extra_classes(scraper, html):
+    questions, total, per_page = extract(scraper, html, 'html.parser', True)
+    assert [q['number'] for q in questions] == [41, 42, 43, 44, 45]
+    assert (total, per_page) == (205, 5)
+    assert questions[1] == {
+        'number': 42,
+        'title': '第42题的题干，包含 <转义> 字符和\xa0空格',
+        'options': ['选项A（第42题）', '选项B（第42题）', '选项C（第42题）', '选项D（第42题）'],
+        'answer': '选项C（第42题）'
+    }
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+@pytest.fixture
+def practice(db):
+    """一个用户和两道已答错的题目，返回 (db, 用户ID, [题目ID])"""
+    user_id = db.get_or_create_user('alice')['id']
+    question_ids = []
+    for number in (1, 2):
+        db.add_question(f'题目{number}', ['甲', '乙', '丙', '丁'], '甲', number)
+        question_id = db.get_question_by_number(number)['id']
+        db.record_wrong_answer(user_id, question_id)
+        question_ids.append(question_id)
+    return db, user_id, question_ids
+
+def traced_answer(db, user_id, question_id, correct):
+    """提交一次错题练习答案，返回结果和执行的 SQL 语句"""
+    statements = []
+    conn = db.get_db()
+    conn.set_trace_callback(statements.append)
+    try:
+        result = db.answer_practice_question(user_id, question_id, correct)
+    finally:
+        conn.set_trace_callback(None)
+    return result, statements
+
+def schedule(db, user_id, question_id):
+    return db.get_db().execute('''
+        SELECT ease, interval_days, repetitions, due_at
+        FROM wrong_answers WHERE user_id = ? AND question_id = ?
+    ''', (user_id, question_id)).fetchone()
+
+def test_correct_answer_statement_count(practice):
+    db, user_id, (first, second) = practice
+    result, statements = traced_answer(db, user_id, first, True)
+    # BEGIN、UPDATE、剩余数和下一题查询、COMMIT
+    assert len(statements) == 4, statements
+    assert result['remaining'] == 1
+    assert result['next']['id'] == second
+
+def test_wrong_answer_statement_count(practice):
+    db, user_id, (first, _) = practice
+    _, statements = traced_answer(db, user_id, first, False)
+    assert len(statements) == 4, statements
+
+def test_graduating_answer_statement_count(practice):
+    db, user_id, (first, _) = practice
+    for _ in range(db.config.PRACTICE_GRADUATE_AFTER - 1):
+        db.answer_practice_question(user_id, first, True)
+    _, statements = traced_answer(db, user_id, first, True)
+    # UPDATE 未匹配时多一条 DELETE
+    assert len(statements) == 5, statements
+    assert schedule(db, user_id, first) is None
+
+def test_correct_answers_follow_sm2_intervals(practice):
+    db, user_id, (first, _) = practice
+    db.config.PRACTICE_GRADUATE_AFTER = 5
+    for repetitions, interval in ((1, 1), (2, 6), (3, 15)):
+        before = time.time()
+        db.answer_practice_question(user_id, first, True)
+        ease, interval_days, stored_repetitions, due_at = schedule(db, user_id, first)
+        assert ease == pytest.approx(2.5)
+        assert interval_days == pytest.approx(interval)
+        assert stored_repetitions == repetitions
+        assert due_at == pytest.approx(before + interval * 86400, abs=5)
+
+def test_wrong_answer_resets_schedule(practice):
+    db, user_id, (first, _) = practice
+    db.answer_practice_question(user_id, first, True)
+    db.answer_practice_question(user_id, first, False)
+    ease, interval_days, repetitions, due_at = schedule(db, user_id, first)
+    assert ease == pytest.approx(1.96)
+    assert (interval_days, repetitions) == (0, 0)
+    assert due_at <= time.time()
@@ -0,0 +1,19 @@
+import pytest
+
+from database import HOT_QUERIES, full_table_scans
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_index(db, name):
+    sql, params = HOT_QUERIES[name]
+    plan = [row[3] for row in db.get_db().execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+    assert not full_table_scans(plan), plan
+
+def test_full_table_scans_detects_scan():
+    plan = ['SCAN questions', 'SEARCH w USING INDEX idx_wrong_answers_user_due (user_id=?)']
+    assert full_table_scans(plan) == ['SCAN questions']
+
+def test_full_table_scans_ignores_derived_tables():
+    plan = ['CO-ROUTINE (subquery-2)', 'SCAN CONSTANT ROW', 'MATERIALIZE n',
+            'SEARCH w USING INDEX idx_wrong_answers_user_due (user_id=?)',
+            'SCAN (subquery-2)', 'SCAN n LEFT-JOIN']
+    assert full_table_scans(plan) == []